@@ -0,0 +1,119 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from certificate_generator import CertificateGenerator, DEFAULT_FORMAT, DEFAULT_QUALITY, IMAGE_FORMATS
+from certificate_store import CertificateStore
+from render_service import available_cpus
+from database import Database
+
+BATCH_SIZE = 500
+DEFAULT_OUTPUT_DIR = os.path.join(os.getcwd(), 'certificates')
+# Bot bilan bir xil disk byudjeti (config.CERT_STORE_MAX_MB)
+DEFAULT_MAX_MB = 900
+
+# Har bir worker jarayonida bitta generator
+_generator = None
+
+
+def _init_worker(template_path, output_dir, image_format, quality):
+    global _generator
+    _generator = CertificateGenerator(
+        template_path=template_path,
+        output_dir=output_dir,
+        image_format=image_format,
+        quality=quality
+    )
+    _generator.plan
+
+
+def _backfill_worker(user_data, certificate_id, force):
+    """(certificate_id, kodlangan baytlar) yoki joriy versiyada bo'lsa (certificate_id, None)"""
+    if not force and _generator.is_current(certificate_id):
+        return certificate_id, None
+    return certificate_id, _generator.encode(user_data, certificate_id)
+
+
+def backfill(db, template_path, output_dir=None, image_format=DEFAULT_FORMAT, quality=DEFAULT_QUALITY,
+             workers=None, batch_size=BATCH_SIZE, force=False, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+    """Sertifikat olgan barcha foydalanuvchilar uchun sertifikatlarni qayta chizish.
+
+    Joriy versiyada chizilgan fayllar o'tkazib yuboriladi, shuning uchun
+    to'xtab qolsa qayta ishga tushirish kifoya. Fayllar CertificateStore
+    orqali yoziladi: atomar (bot bir vaqtda o'qisa ham) va disk byudjeti ichida.
+    """
+    workers = workers or available_cpus()
+    output_dir = output_dir or DEFAULT_OUTPUT_DIR
+    store = CertificateStore(output_dir, max_bytes=max_bytes, extension=IMAGE_FORMATS[image_format.upper()])
+    total = db.get_stats()['total_certificates']
+    counts = {'rendered': 0, 'skipped': 0}
+    started = time.perf_counter()
+    after_id = 0
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(template_path, output_dir, image_format, quality)
+    ) as executor:
+        while True:
+            batch = db.get_claimed_certificates(after_id, batch_size)
+            if not batch:
+                break
+            after_id = batch[-1][0]
+
+            results = executor.map(
+                _backfill_worker,
+                [(user_id, username, first_name) for _, user_id, username, first_name, _ in batch],
+                [certificate_id for *_, certificate_id in batch],
+                [force] * len(batch),
+                chunksize=max(1, len(batch) // (workers * 4))
+            )
+            for certificate_id, data in results:
+                if data is None:
+                    counts['skipped'] += 1
+                else:
+                    store.put(certificate_id, data)
+                    counts['rendered'] += 1
+
+            done = counts['rendered'] + counts['skipped']
+            elapsed = time.perf_counter() - started
+            print(
+                f"⏳ {done}/{total} | chizildi: {counts['rendered']}, "
+                f"o'tkazildi: {counts['skipped']} | {counts['rendered'] / elapsed:.1f} sertifikat/s | "
+                f"disk: {store.total_bytes / 1024 / 1024:.0f}/{store.max_bytes / 1024 / 1024:.0f} MB"
+            )
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sertifikatlarni qayta chizish (backfill)")
+    parser.add_argument('--template', default='template.jpg')
+    parser.add_argument('--output-dir', help="Staging papka (standart: certificates/)")
+    parser.add_argument('--format', default=os.environ.get('CERT_FORMAT', DEFAULT_FORMAT))
+    parser.add_argument('--quality', type=int, default=int(os.environ.get('CERT_QUALITY', DEFAULT_QUALITY)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('RENDER_WORKERS', 0)) or None,
+                        help="Jarayonlar soni (standart: RENDER_WORKERS yoki ruxsat berilgan yadrolar)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--force', action='store_true', help="Versiyadan qat'i nazar hammasini qayta chizish")
+    parser.add_argument('--max-mb', type=int, default=int(os.environ.get('CERT_STORE_MAX_MB', DEFAULT_MAX_MB)),
+                        help="Papka uchun disk byudjeti, MB (standart: CERT_STORE_MAX_MB)")
+    args = parser.parse_args()
+
+    counts = backfill(
+        Database(),
+        args.template,
+        output_dir=args.output_dir,
+        image_format=args.format,
+        quality=args.quality,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        force=args.force,
+        max_bytes=args.max_mb * 1024 * 1024
+    )
+    print(f"✅ Tayyor: {counts['rendered']} chizildi, {counts['skipped']} o'tkazildi")
+
+
+if __name__ == '__main__':
+    main()
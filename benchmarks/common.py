@@ -0,0 +1,79 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+INSERT_CHUNK = 50000
+
+
+def temp_database(name='bench.db'):
+    """Vaqtinchalik SQLite fayl ustida Database (lokal DB o'rniga)"""
+    from database import Database
+
+    directory = tempfile.mkdtemp(prefix='bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, name)}"
+    return Database()
+
+
+def referral_count(rng):
+    """Kampaniyaga o'xshash taqsimot: ko'pchilik hech kimni taklif qilmagan"""
+    if rng.random() < 0.7:
+        return 0
+    return min(int(rng.expovariate(0.3)) + 1, 500)
+
+
+def populate_users(db, count, claimed_every=0, seed=1):
+    """users jadvaliga count ta foydalanuvchini partiyalab yozish"""
+    from database import User
+
+    rng = random.Random(seed)
+    started = datetime.now() - timedelta(days=30)
+    with db.engine.begin() as conn:
+        for offset in range(0, count, INSERT_CHUNK):
+            rows = []
+            for user_id in range(offset + 1, min(offset + INSERT_CHUNK, count) + 1):
+                claimed = bool(claimed_every) and user_id % claimed_every == 0
+                rows.append({
+                    'user_id': user_id,
+                    'username': f"user{user_id}",
+                    'first_name': f"User {user_id}",
+                    'referral_code': f"REF{user_id}",
+                    'referrals_count': referral_count(rng),
+                    'certificate_claimed': 1 if claimed else 0,
+                    'certificate_id': f"CERT-202401-{user_id:08d}" if claimed else None,
+                    'claimed_date': started if claimed else None,
+                    'created_at': started + timedelta(seconds=user_id)
+                })
+            conn.execute(insert(User.__table__), rows)
+    db.recount_stats()
+
+
+def populate_referrals(db, count, seed=2):
+    """Tasodifiy referal daraxti: i-foydalanuvchini 1..i-1 dan biri taklif qilgan"""
+    from database import Referral
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    with db.engine.begin() as conn:
+        for offset in range(2, count + 1, INSERT_CHUNK):
+            conn.execute(insert(Referral.__table__), [
+                {'referrer_id': rng.randint(1, user_id - 1), 'referred_id': user_id, 'created_at': now}
+                for user_id in range(offset, min(offset + INSERT_CHUNK, count + 1))
+            ])
+
+
+def percentiles(samples):
+    """(p50, p99) millisekundlarda"""
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return statistics.median(ordered) * 1000, p99 * 1000
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
@@ -0,0 +1,42 @@
+"""Eksport xotira sarfi qatorlar soniga bog'liq emasligini o'lchash.
+
+    python -m benchmarks.export --sizes 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import tracemalloc
+
+from benchmarks.common import populate_referrals, populate_users, temp_database, timed
+from export import export
+
+
+def run(size, kinds, fmt):
+    db = temp_database(f"export-{size}.db")
+    populate_users(db, size, claimed_every=10)
+    populate_referrals(db, size)
+    directory = tempfile.mkdtemp(prefix='export-')
+
+    for kind in kinds:
+        path = os.path.join(directory, f"{kind}.{fmt}.gz")
+        tracemalloc.start()
+        rows, seconds = timed(export, db.engine, kind, fmt, path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{size:>9} | {kind:<16} {rows:>9} qator | {seconds:6.1f} s | "
+              f"{os.path.getsize(path) / 1024 / 1024:6.1f} MB gzip | eng ko'p xotira {peak / 1024 / 1024:5.1f} MB")
+    db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Oqimli eksport benchmarki")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--kinds', nargs='+', default=['users', 'referrals_joined'])
+    parser.add_argument('--format', default='csv')
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.kinds, args.format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Reyting tugmasi kechikishi foydalanuvchilar soniga bog'liq emasligini o'lchash.
+
+    python -m benchmarks.leaderboard --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+
+from benchmarks.common import percentiles, populate_users, temp_database, timed
+from leaderboard import Leaderboard
+
+
+def click(db, leaderboard, user_id):
+    """bot.button_handler dagi "leaderboard" tarmog'i (xabar yuborishsiz)"""
+    top = leaderboard.top()
+    rank = leaderboard.rank_in_memory(user_id)
+    if rank is None:
+        user = db.get_user(user_id)
+        rank = leaderboard.rank_for_count(user.referrals_count)
+    return top, rank
+
+
+def run(size, clicks):
+    db = temp_database(f"leaderboard-{size}.db")
+    populate_users(db, size)
+    leaderboard = Leaderboard(db)
+    _, warm_seconds = timed(leaderboard.warm)
+
+    rng = random.Random(size)
+    samples = []
+    for _ in range(clicks):
+        user_id = rng.randint(1, size)
+        (_, rank), seconds = timed(click, db, leaderboard, user_id)
+        samples.append(seconds)
+
+    # Tasodifiy foydalanuvchilar uchun aniq rank bilan solishtirish
+    for user_id in rng.sample(range(1, size + 1), 20):
+        assert click(db, leaderboard, user_id)[1] == db.get_user_rank(user_id)[0]
+
+    p50, p99 = percentiles(samples)
+    print(f"{size:>9} foydalanuvchi | warm {warm_seconds * 1000:7.1f} ms | "
+          f"bosish p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+    db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reyting tugmasi benchmarki")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--clicks', type=int, default=2000)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.clicks)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Referal daraxti: to'liq qurish (3-migratsiya va /tree rebuild), so'rovlar
+va har bir ro'yxatdan o'tishdagi qo'shimcha ish (lokal SQLite ustida).
+
+    python -m benchmarks.referral_tree --sizes 100000 1000000 --signups 2000
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import func, select
+
+from benchmarks.common import percentiles, populate_referrals, populate_users, temp_database, timed
+from database import ReferralPath
+
+
+def latencies(func, calls):
+    samples = []
+    for args in calls:
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def run(size, signups, queries):
+    db = temp_database(f"tree-{size}.db")
+    populate_users(db, size)
+    populate_referrals(db, size)
+
+    nodes, seconds = timed(db.rebuild_referral_tree)
+    with db.engine.connect() as conn:
+        paths = conn.execute(select(func.count()).select_from(ReferralPath)).scalar()
+    print(f"{size:>9} | to'liq qurish: {seconds:6.1f} s | {nodes} tugun, {paths} closure qator "
+          f"(o'rtacha chuqurlik {paths / max(nodes, 1):.1f})")
+
+    rng = random.Random(7)
+    p50, p99 = latencies(db.get_referral_tree, [(rng.randint(1, size),) for _ in range(queries)])
+    print(f"{'':>9} | /tree <id>: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    p50, p99 = latencies(db.get_referral_tree, [(1,)] * 20)
+    print(f"{'':>9} | /tree <ildiz>: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    for by in ('descendants', 'max_depth'):
+        p50, p99 = latencies(db.get_top_subtrees, [(10, by)] * 50)
+        print(f"{'':>9} | top 10 ({by}): p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+    # Daraxtni yangilash ro'yxatdan o'tish tranzaksiyasi ichida
+    calls = [(size + n, None, f"User {size + n}", rng.randint(1, size)) for n in range(1, signups + 1)]
+    p50, p99 = latencies(db.add_user, calls)
+    print(f"{'':>9} | ro'yxatdan o'tish (referal bilan): p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+    # Yangilangan daraxt to'liq qurish natijasiga teng
+    root = db.get_referral_tree(1)['descendants']
+    db.rebuild_referral_tree()
+    assert db.get_referral_tree(1)['descendants'] == root == size + signups - 1
+    db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Referal daraxti benchmarki")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--signups', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.signups, args.queries)
+
+
+if __name__ == '__main__':
+    main()
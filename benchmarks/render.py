@@ -0,0 +1,75 @@
+"""Sertifikat chizish tezligi: render plan'dan oldingi va keyingi yo'l.
+
+    python -m benchmarks.render --count 200 --template template.jfif
+"""
+import argparse
+import io
+import os
+import time
+
+from certificate_generator import CertificateGenerator, TEXT_FONT_PATH, TITLE_FONT_PATH
+
+
+def legacy_encode(template_path, user_data, certificate_id):
+    """Render plan'gacha bo'lgan CertificateGenerator.generate (faylga yozmasdan):
+    har safar shablon ochiladi, fontlar yuklanadi, hamma matn qayta chiziladi"""
+    import qrcode
+    from PIL import Image, ImageDraw, ImageFont
+
+    if os.path.exists(template_path):
+        img = Image.open(template_path)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+    else:
+        img = Image.new('RGB', (1200, 800), color='white')
+    draw = ImageDraw.Draw(img)
+    title_font = ImageFont.truetype(TITLE_FONT_PATH, 60)
+    name_font = ImageFont.truetype(TITLE_FONT_PATH, 80)
+    text_font = ImageFont.truetype(TEXT_FONT_PATH, 30)
+    draw.text((600, 150), "CERTIFICATE", fill="#001b3b", font=title_font, anchor="mm")
+    draw.text((600, 350), "This certificate is proudly presented to", fill="#4a5568", font=text_font, anchor="mm")
+    draw.text((600, 430), user_data[2], fill="#001b3b", font=name_font, anchor="mm")
+    qr = qrcode.QRCode(version=1, box_size=5, border=2)
+    qr.add_data(f"https://omp.aistudy.uz/certificate?id={certificate_id}")
+    qr.make(fit=True)
+    img.paste(qr.make_image(fill_color="black", back_color="white").convert('RGB'), (50, 50))
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def measure(label, func, count):
+    sizes = 0
+    started = time.perf_counter()
+    for i in range(count):
+        sizes += len(func((i, f"user{i}", f"User Number {i}"), f"CERT-202401-{i:08d}"))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {count / elapsed:7.1f} sertifikat/s | o'rtacha {sizes / count / 1024:5.1f} KB")
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sertifikat chizish benchmarki (bitta jarayon)")
+    parser.add_argument('--template', default='template.jfif')
+    parser.add_argument('--count', type=int, default=200)
+    args = parser.parse_args()
+
+    generator = CertificateGenerator(template_path=args.template)
+    legacy_q95 = CertificateGenerator(template_path=args.template, quality=95)
+    generator.encode((0, None, 'warmup'), 'CERT-202401-WARMUP00')
+    legacy_q95.plan
+
+    def plan_baseline_encoding(user_data, certificate_id):
+        # Kodlash eski sozlamada (quality=95, progressive emas) - faqat render farqi
+        buffer = io.BytesIO()
+        legacy_q95.render(user_data, certificate_id).save(buffer, 'JPEG', quality=95)
+        return buffer.getvalue()
+
+    before = measure("oldin (har safar shablon+fontlar)", lambda u, c: legacy_encode(args.template, u, c), args.count)
+    after = measure("render plan, JPEG q95", plan_baseline_encoding, args.count)
+    measure(f"render plan, {generator.image_format} q{generator.quality} (joriy)", generator.encode, args.count)
+    print(f"render plan tezlashuvi: {after / before:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
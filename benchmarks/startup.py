@@ -0,0 +1,123 @@
+"""Sovuq ishga tushish: bot.py import vaqti va birinchi update qayta ishlanguncha vaqt.
+
+Har bir o'lchov yangi jarayonda: Telegram Bot API stub bilan almashtiriladi
+(polling rejimi), DB - vaqtinchalik SQLite fayl.
+
+    python -m benchmarks.startup --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+FIRST_UPDATE = {
+    'update_id': 1,
+    'message': {
+        'message_id': 1,
+        'date': 0,
+        'chat': {'id': 42, 'type': 'private'},
+        'from': {'id': 42, 'is_bot': False, 'first_name': 'Benchmark'},
+        'text': '/start',
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+    }
+}
+
+
+def child():
+    started = time.perf_counter()
+    import bot
+    imported = time.perf_counter()
+
+    import asyncio
+    import signal
+    from telegram.request import BaseRequest
+
+    timings = {}
+
+    class StubRequest(BaseRequest):
+        delivered = False
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                             connect_timeout=None, pool_timeout=None):
+            endpoint = url.rsplit('/', 1)[-1]
+            params = request_data.parameters if request_data else {}
+            if endpoint == 'getMe':
+                result = {'id': 1, 'is_bot': True, 'first_name': 'Bot', 'username': 'bench_bot'}
+            elif endpoint == 'getUpdates':
+                if StubRequest.delivered:
+                    await asyncio.sleep(0.05)
+                    result = []
+                else:
+                    StubRequest.delivered = True
+                    timings.setdefault('polling', time.perf_counter())
+                    result = [FIRST_UPDATE]
+            elif endpoint == 'sendMessage':
+                timings.setdefault('first_reply', time.perf_counter())
+                os.kill(os.getpid(), signal.SIGINT)
+                result = {'message_id': 2, 'date': 0, 'chat': {'id': params['chat_id'], 'type': 'private'},
+                          'text': params.get('text', '')}
+            else:
+                result = True
+            return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    bot.InstrumentedRequest = lambda **kwargs: StubRequest()
+    asyncio.run(bot.serve())
+    print(json.dumps({
+        'import': imported - started,
+        'polling': timings['polling'] - started,
+        'first_update': timings['first_reply'] - started
+    }))
+
+
+def run_once():
+    directory = tempfile.mkdtemp(prefix='startup-')
+    env = dict(
+        os.environ,
+        BOT_TOKEN='1:BENCH',
+        BOT_MODE='polling',
+        PORT='0',
+        DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bot.db')}"
+    )
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', '--child'],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    wall = time.perf_counter() - started
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = wall
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ishga tushish vaqti benchmarki")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    runs = [run_once() for _ in range(args.runs)]
+    for key, label in (
+        ('import', "import bot"),
+        ('polling', "polling boshlanguncha"),
+        ('first_update', "birinchi update javobigacha"),
+        ('process', "jarayon (yaratish -> to'xtash)"),
+    ):
+        values = [run[key] * 1000 for run in runs]
+        print(f"{label:<34} median {statistics.median(values):7.1f} ms (min {min(values):.1f}, max {max(values):.1f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""/certificate tekshiruv endpointi uchun yuklama testi (lokal SQLite ustida).
+
+    python -m benchmarks.verify --users 100000 --requests 20000 --concurrency 64
+"""
+import argparse
+import asyncio
+import random
+import time
+import types
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.common import percentiles, populate_users, temp_database
+from certificate_verifier import CertificateVerifier
+from database import AsyncDatabase
+from web_server import create_web_app
+
+CLAIMED_EVERY = 10
+
+
+def request_mix(users, count, seed=5):
+    """QR skanerlariga o'xshash aralashma: haqiqiy (takrorlanuvchi), mavjud emas va noto'g'ri ID lar"""
+    rng = random.Random(seed)
+    popular = [f"CERT-202401-{user_id:08d}" for user_id in range(CLAIMED_EVERY, users + 1, CLAIMED_EVERY)]
+    popular = rng.sample(popular, min(len(popular), 2000))
+    missing = [f"CERT-209901-{n:08d}" for n in range(500)]
+    mix = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.8:
+            mix.append(('valid', rng.choice(popular)))
+        elif roll < 0.9:
+            mix.append(('missing', rng.choice(missing)))
+        else:
+            mix.append(('bogus', f"nonsense-{rng.randint(0, 10 ** 9)}"))
+    return mix
+
+
+async def load(users, total, concurrency, port):
+    db = temp_database(f"verify-{users}.db")
+    populate_users(db, users, claimed_every=CLAIMED_EVERY)
+    adb = AsyncDatabase(db)
+    verifier = CertificateVerifier(adb)
+    await verifier.warm()
+    app = create_web_app(types.SimpleNamespace(bot=None), verifier=verifier)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+
+    queue = asyncio.Queue()
+    for item in request_mix(users, total):
+        queue.put_nowait(item)
+    latencies = []
+    statuses = {}
+    etags = {}
+
+    async def client(session):
+        while not queue.empty():
+            kind, certificate_id = queue.get_nowait()
+            headers = {}
+            # Brauzer qayta ochganda ETag bilan keladi
+            if certificate_id in etags and random.random() < 0.3:
+                headers['If-None-Match'] = etags[certificate_id]
+            started = time.perf_counter()
+            async with session.get(f"http://127.0.0.1:{port}/certificate",
+                                   params={'id': certificate_id, 'format': 'json'}, headers=headers) as response:
+                await response.read()
+                if 'ETag' in response.headers:
+                    etags[certificate_id] = response.headers['ETag']
+            latencies.append(time.perf_counter() - started)
+            statuses[(kind, response.status)] = statuses.get((kind, response.status), 0) + 1
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    await runner.cleanup()
+    adb.close()
+    p50, p99 = percentiles(latencies)
+    print(f"{total} so'rov, {concurrency} parallel: {total / elapsed:.0f} so'rov/s | p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    print(f"DB ga yetgan so'rovlar: {verifier.misses} ({verifier.misses / total:.1%}), kesh hit: {verifier.hits}, "
+          f"to'plamda yo'q: {verifier.rejected}")
+    print("javoblar:", ", ".join(f"{kind} {status}: {n}" for (kind, status), n in sorted(statuses.items())))
+    assert statuses.get(('valid', 404), 0) == 0 and statuses.get(('bogus', 200), 0) == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/certificate yuklama testi")
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--port', type=int, default=8089)
+    args = parser.parse_args()
+    asyncio.run(load(args.users, args.requests, args.concurrency, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,31 @@
+import time
+STARTED_AT = time.monotonic()
+
 import os
 import logging
 import asyncio
-import threading
-import time
-from flask import Flask
+import signal
+import tempfile
+from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-from config import BOT_TOKEN, ADMIN_IDS
-from database import Database
-from certificate_generator import CertificateGenerator
+from config import (
+    BOT_TOKEN, ADMIN_IDS, BOT_MODE, PORT, MAX_CONCURRENT_UPDATES, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    METRICS_TOKEN,
+    CERT_FORMAT, CERT_QUALITY, CERT_STORE_MAX_MB, RENDER_WORKERS
+)
+from database import AsyncDatabase, Database
+from render_service import RenderService
+from certificate_generator import IMAGE_FORMATS
+from certificate_store import CertificateStore
+from leaderboard import Leaderboard
+from broadcast import Broadcaster
+from certificate_verifier import CertificateVerifier
+from export import export, export_filename, KINDS, FORMATS
+from update_processor import PerUserUpdateProcessor
+from metrics import InstrumentedRequest, track_handler
+from web_server import create_web_app, ensure_webhook, start_web_server
 
 # Logging
 logging.basicConfig(
@@ -17,20 +34,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# DB va generator
-db = Database()
-cert_gen = CertificateGenerator(template_path='template.jpg')
-
-# Flask app
-app = Flask(__name__)
-
-@app.route('/')
-def home():
-    return 'Bot ishlayapti!', 200
+# Sertifikat chizish jarayonlari boshqa threadlardan oldin ishga tushiriladi
+render_service = RenderService(template_path='template.jpg', image_format=CERT_FORMAT, quality=CERT_QUALITY,
+                               max_workers=RENDER_WORKERS)
+render_service.start()
+certificate_store = CertificateStore(
+    os.path.join(os.getcwd(), 'certificates'),
+    max_bytes=CERT_STORE_MAX_MB * 1024 * 1024,
+    extension=IMAGE_FORMATS[CERT_FORMAT]
+)
 
-@app.route('/health')
-def health():
-    return 'OK', 200
+# DB va reyting
+db = AsyncDatabase(Database(ensure_schema=False))
+leaderboard = Leaderboard(db.db)
+verifier = CertificateVerifier(db)
 
 # Bot handlerlar
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -39,11 +56,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     referred_by = None
     if args and args[0].startswith('REF'):
-        referrer = db.get_user_by_referral_code(args[0])
+        referrer = await db.get_user_by_referral_code(args[0])
         if referrer:
             referred_by = referrer.user_id
     
-    user_data = db.add_user(
+    user_data = await db.add_user(
         user_id=user.id,
         username=user.username,
         first_name=user.first_name,
@@ -51,12 +68,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     if not user_data:
-        user_data = db.get_user(user.id)
+        user_data = await db.get_user(user.id)
     
-    bot_username = (await context.bot.get_me()).username
+    bot_username = context.bot.username  # Application.initialize da keshlangan
     referral_link = f"https://t.me/{bot_username}?start={user_data.referral_code}"
     
-    can_claim, claim_msg = db.can_claim_certificate(user.id)
+    can_claim, claim_msg = Database.check_claim(user_data)
     
     text = (
         f"👋 Assalomu alaykum, {user.first_name}!\n\n"
@@ -85,28 +102,109 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
+# Taklif qilganlar ro'yxati sahifalari
+# callback_data: refs|<n yoki p>|<sahifa boshlanish indeksi>|<created_at>|<id>
+def encode_referrals_cursor(direction, start, cursor):
+    created_at, ref_id = cursor
+    return f"refs|{direction}|{start}|{created_at.isoformat()}|{ref_id}"
+
+async def show_referrals_page(query, user_id):
+    after = before = None
+    start = 0
+    if query.data.startswith("refs|"):
+        _, direction, start, created_at, ref_id = query.data.split("|")
+        start = int(start)
+        cursor = (datetime.fromisoformat(created_at), int(ref_id))
+        if direction == "n":
+            after = cursor
+        else:
+            before = cursor
+    
+    page = await db.get_referrals(user_id, after=after, before=before)
+    items = page['items']
+    if before:
+        start -= len(items)
+    
+    if not items:
+        text = "Siz hali hech kimni taklif qilmagansiz."
+    else:
+        text = "👥 **Siz taklif qilganlar:**\n\n"
+        for i, (ref_id, username, name, date) in enumerate(items, start + 1):
+            text += f"{i}. {name} (@{username}) - {str(date)[:10]}\n"
+    
+    nav = []
+    if page['prev']:
+        nav.append(InlineKeyboardButton("⬅️ Oldingi", callback_data=encode_referrals_cursor("p", start, page['prev'])))
+    if page['next']:
+        nav.append(InlineKeyboardButton("Keyingi ➡️", callback_data=encode_referrals_cursor("n", start + len(items), page['next'])))
+    
+    keyboard = [nav] if nav else []
+    keyboard.append([InlineKeyboardButton("🔙 Orqaga", callback_data="back")])
+    await query.edit_message_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
+
+async def certificate_image(record):
+    """/certificate?image=1 uchun: tekshiruvdan o'tgan yozuv bo'yicha rasm.
+
+    Ochiq so'rov claim'lar uchun pool'ni band qilmasligi kerak: ombordan
+    o'chirilgan sertifikat faqat bo'sh worker bo'lsa qayta chiziladi
+    (aks holda None), va LRU ni aylantirmaslik uchun omborga yozilmaydi.
+    """
+    data = await asyncio.to_thread(certificate_store.get, record['certificate_id'])
+    if data is None:
+        if render_service.saturated:
+            return None
+        data = await render_service.render((None, None, record['name']), record['certificate_id'])
+    return data, certificate_store.content_type
+
+async def send_certificate(message, user, certificate_id, fresh=False):
+    """Sertifikatni yuborish: avval saqlangan file_id orqali, bo'lmasa chizib yuklash.
+    fresh=True - hozirgina olingan sertifikat, file_id hali bo'lishi mumkin emas"""
+    caption = f"🎉 **Tabriklaymiz!**\n\nSertifikatingiz tayyor!\nID: `{certificate_id}`"
+    
+    file_id = None if fresh else await db.get_certificate_file_id(certificate_id)
+    if file_id:
+        try:
+            await message.reply_photo(photo=file_id, caption=caption, parse_mode='Markdown')
+            return
+        except BadRequest as e:
+            logger.warning(f"file_id rad etildi ({certificate_id}): {e}")
+            await db.delete_certificate_file_id(certificate_id)
+    
+    # Ombordan o'qish, bo'lmasa (yoki o'chirilgan bo'lsa) qayta chizish
+    photo = await asyncio.to_thread(certificate_store.get, certificate_id)
+    rendered = photo is None
+    if rendered:
+        photo = await render_service.render((user.user_id, user.username, user.first_name), certificate_id)
+    try:
+        sent = await message.reply_photo(photo=photo, caption=caption, parse_mode='Markdown')
+    finally:
+        # Foydalanuvchi disk yozishini kutmaydi; yuborish xato bersa ham chizilgani saqlanadi
+        if rendered:
+            await asyncio.to_thread(certificate_store.put, certificate_id, photo)
+    await db.save_certificate_file_id(certificate_id, sent.photo[-1].file_id)
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     user_id = query.from_user.id
     
-    if query.data == "referrals":
-        referrals = db.get_referrals(user_id)
-        if not referrals:
-            text = "Siz hali hech kimni taklif qilmagansiz."
-        else:
-            text = "👥 **Siz taklif qilganlar:**\n\n"
-            for i, (ref_id, username, name, date) in enumerate(referrals, 1):
-                text += f"{i}. {name} (@{username}) - {str(date)[:10]}\n"
-        
-        await query.edit_message_text(text, parse_mode='Markdown')
-        
-        keyboard = [[InlineKeyboardButton("🔙 Orqaga", callback_data="back")]]
-        await query.edit_message_reply_markup(InlineKeyboardMarkup(keyboard))
+    if query.data == "referrals" or query.data.startswith("refs|"):
+        await show_referrals_page(query, user_id)
     
     elif query.data == "claim":
-        can_claim, msg = db.can_claim_certificate(user_id)
+        user = await db.get_user(user_id)
+        if user and user.certificate_claimed:
+            # Avval olingan sertifikatni qayta yuborish
+            await send_certificate(query.message, user, user.certificate_id)
+            await query.edit_message_text("✅ Sertifikatingiz qayta yuborildi!")
+            return
+        
+        can_claim, msg = Database.check_claim(user)
         
         if not can_claim:
             await query.edit_message_text(f"❌ {msg}")
@@ -114,35 +212,59 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_reply_markup(InlineKeyboardMarkup(keyboard))
             return
         
-        success, result = db.claim_certificate(user_id)
+        if render_service.full:
+            await query.edit_message_text("⏳ Hozir so'rovlar juda ko'p. Birozdan keyin qayta urinib ko'ring.")
+            keyboard = [[InlineKeyboardButton("🔙 Orqaga", callback_data="back")]]
+            await query.edit_message_reply_markup(InlineKeyboardMarkup(keyboard))
+            return
+        
+        success, result = await db.claim_certificate(user_id)
         if success:
-            user = db.get_user(user_id)
-            cert_path = cert_gen.generate(user, result)
-            
-            with open(cert_path, 'rb') as f:
-                await query.message.reply_photo(
-                    photo=f,
-                    caption=f"🎉 **Tabriklaymiz!**\n\nSertifikatingiz tayyor!\nID: `{result}`",
-                    parse_mode='Markdown'
-                )
+            if render_service.saturated:
+                await query.edit_message_text("⏳ Sertifikatingiz navbatda, tez orada tayyor bo'ladi...")
+            await send_certificate(query.message, result, result.certificate_id, fresh=True)
             
             await query.edit_message_text("✅ Sertifikatingiz yuborildi!")
         else:
             await query.edit_message_text(f"❌ Xatolik: {result}")
     
     elif query.data == "leaderboard":
-        # Leaderboard uchun alohida so'rov
-        await query.edit_message_text("🏆 Leaderboard tez orada qo'shiladi")
+        text = "🏆 **Reyting**\n\n"
+        top = leaderboard.top()
+        if not top:
+            text += "Hozircha reyting bo'sh.\n"
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        for i, (top_user_id, count, name) in enumerate(top, 1):
+            text += f"{medals.get(i, f'{i}.')} {name or top_user_id} - `{count}`\n"
+        
+        rank = leaderboard.rank_in_memory(user_id)
+        if rank is None:
+            user = await db.get_user(user_id)
+            rank = user and leaderboard.rank_for_count(user.referrals_count)
+        if rank:
+            text += f"\n📍 Sizning o'rningiz: `{rank}`"
+        
         keyboard = [[InlineKeyboardButton("🔙 Orqaga", callback_data="back")]]
-        await query.edit_message_reply_markup(InlineKeyboardMarkup(keyboard))
+        await query.edit_message_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
     
     elif query.data == "admin" and query.from_user.id in ADMIN_IDS:
-        stats = db.get_stats()
+        stats = await db.get_stats()
+        cache = db.db.cache.stats()
+        store = certificate_store.stats()
         text = (
             f"📊 **Admin Panel**\n\n"
             f"👥 Umumiy foydalanuvchilar: `{stats['total_users']}`\n"
             f"🎓 Sertifikat olganlar: `{stats['total_certificates']}`\n"
-            f"🔗 Jami referallar: `{stats['total_referrals']}`"
+            f"🔗 Jami referallar: `{stats['total_referrals']}`\n\n"
+            f"📈 Oxirgi 24 soatda ro'yxatdan o'tganlar: `{stats['registrations_24h']}`\n"
+            f"📈 Oxirgi 7 kunda sertifikat olganlar: `{stats['claims_7d']}`\n\n"
+            f"⚡️ Kesh: `{cache['hits']}` hit / `{cache['misses']}` miss ({cache['hit_rate']:.0%})\n"
+            f"💾 Sertifikatlar: `{store['files']}` ta, `{store['bytes'] / 1024 / 1024:.1f}`/"
+            f"`{store['max_bytes'] / 1024 / 1024:.0f}` MB, hit `{store['hit_rate']:.0%}`"
         )
         await query.edit_message_text(text, parse_mode='Markdown')
     
@@ -150,15 +272,19 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Orqaga qaytish - start ni chaqirish
         await start(query, context)
 
+def button_label(update):
+    """Metrikalar uchun tugma tarmog'i nomi (refs|... -> button:refs)"""
+    return "button:" + update.callback_query.data.split("|")[0]
+
 async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     
     if not user_data:
         await update.message.reply_text("❌ Avval /start ni bosing!")
         return
     
-    bot_username = (await context.bot.get_me()).username
+    bot_username = context.bot.username  # Application.initialize da keshlangan
     referral_link = f"https://t.me/{bot_username}?start={user_data.referral_code}"
     
     text = (
@@ -172,7 +298,7 @@ async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     
     if not user_data:
         await update.message.reply_text("❌ Avval /start ni bosing!")
@@ -192,6 +318,114 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(text, parse_mode='Markdown')
 
+async def recount_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: statistika hisoblagichlarini qayta hisoblash"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    
+    stats = await db.recount_stats()
+    text = (
+        f"♻️ **Statistika qayta hisoblandi**\n\n"
+        f"👥 Foydalanuvchilar: `{stats['total_users']}`\n"
+        f"🎓 Sertifikatlar: `{stats['total_certificates']}`\n"
+        f"🔗 Referallar: `{stats['total_referrals']}`"
+    )
+    await update.message.reply_text(text, parse_mode='Markdown')
+
+async def tree_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: /tree - eng katta quyi daraxtlar, /tree <user_id> - bitta foydalanuvchi,
+    /tree rebuild - daraxtni referrals dan qayta qurish"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    
+    args = context.args
+    if args and args[0] == 'rebuild':
+        await update.message.reply_text("⏳ Referal daraxti qayta qurilmoqda...")
+        nodes = await db.rebuild_referral_tree()
+        await update.message.reply_text(f"♻️ Referal daraxti qayta qurildi: `{nodes}` tugun", parse_mode='Markdown')
+        return
+    
+    if args:
+        if not args[0].isdigit():
+            await update.message.reply_text("❌ Foydalanish: /tree [user_id|rebuild]")
+            return
+        tree = await db.get_referral_tree(int(args[0]))
+        if not tree:
+            await update.message.reply_text("🌱 Bu foydalanuvchi referal daraxtida yo'q.")
+            return
+        text = (
+            f"🌳 **Referal daraxti:** `{args[0]}`\n\n"
+            f"📍 Chuqurlik: `{tree['depth']}`\n"
+            f"👥 Jami avlodlar: `{tree['descendants']}`\n"
+            f"🔗 Eng uzun zanjir: `{tree['max_depth']}`\n\n"
+        )
+        text += "\n".join(f"{depth}-daraja: `{count}`" for depth, count in tree['levels'])
+        await update.message.reply_text(text, parse_mode='Markdown')
+        return
+    
+    largest, deepest = await asyncio.gather(
+        db.get_top_subtrees(10),
+        db.get_top_subtrees(5, by='max_depth')
+    )
+    text = "🌳 **Eng katta referal daraxtlari**\n\n"
+    for i, (user_id, first_name, descendants, max_depth) in enumerate(largest, 1):
+        text += f"{i}. {first_name or user_id} - `{descendants}` avlod, `{max_depth}` daraja\n"
+    text += "\n🔗 **Eng uzun zanjirlar**\n\n"
+    for i, (user_id, first_name, descendants, max_depth) in enumerate(deepest, 1):
+        text += f"{i}. {first_name or user_id} - `{max_depth}` daraja, `{descendants}` avlod\n"
+    await update.message.reply_text(text, parse_mode='Markdown')
+
+async def run_broadcast(bot, broadcast, admin_id=None):
+    sent, failed = await Broadcaster(bot, db).run(broadcast)
+    if admin_id:
+        await bot.send_message(
+            chat_id=admin_id,
+            text=f"📣 Broadcast #{broadcast.id} tugadi: {sent} ta yuborildi, {failed} ta xato"
+        )
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: /broadcast <matn> - barcha foydalanuvchilarga yuborish"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    
+    text = update.message.text.partition(' ')[2].strip()
+    if not text:
+        await update.message.reply_text("❌ Foydalanish: /broadcast <matn>")
+        return
+    if await db.get_unfinished_broadcasts():
+        await update.message.reply_text("⏳ Oldingi broadcast hali tugamagan.")
+        return
+    
+    broadcast = await db.create_broadcast(text, update.effective_user.id)
+    context.application.create_task(run_broadcast(context.bot, broadcast, update.effective_user.id))
+    await update.message.reply_text(f"📣 Broadcast #{broadcast.id} boshlandi.")
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: /export <users|referrals|referrals_joined|certificates> [csv|jsonl]"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    
+    args = context.args
+    kind = args[0] if args else 'users'
+    fmt = args[1] if len(args) > 1 else 'csv'
+    if kind not in KINDS or fmt not in FORMATS:
+        await update.message.reply_text(
+            f"❌ Foydalanish: /export <{'|'.join(KINDS)}> [{'|'.join(FORMATS)}]"
+        )
+        return
+    
+    await update.message.reply_text("⏳ Eksport tayyorlanmoqda...")
+    filename = export_filename(kind, fmt)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, filename)
+        rows = await asyncio.to_thread(export, db.db.engine, kind, fmt, path)
+        with open(path, 'rb') as f:
+            await update.message.reply_document(
+                document=f,
+                filename=filename,
+                caption=f"📦 {kind}: {rows} qator"
+            )
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (
         "🔰 **Yordam**\n\n"
@@ -209,50 +443,114 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.error(f"Xatolik: {context.error}")
 
+async def post_init(application: Application):
+    """Reytingni DB dan to'ldirish va davriy yangilashni boshlash"""
+    await asyncio.to_thread(leaderboard.warm)
+    application.create_task(leaderboard.reconcile_forever())
+    # Berilgan sertifikatlar to'plami - tasodifiy ID lar DB ga bormaydi
+    await verifier.warm()
+    
+    # To'xtab qolgan broadcastlarni davom ettirish
+    for broadcast in await db.get_unfinished_broadcasts():
+        application.create_task(run_broadcast(application.bot, broadcast, broadcast.created_by))
+
+async def post_shutdown(application: Application):
+    render_service.shutdown()
+
+ALLOWED_UPDATES = ['message', 'callback_query']
+
+def build_application():
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(InstrumentedRequest())
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .build()
+    )
+    
+    # Handlerlar
+    application.add_handler(CommandHandler("start", track_handler("start")(start)))
+    application.add_handler(CommandHandler("referral", track_handler("referral")(referral_command)))
+    application.add_handler(CommandHandler("stats", track_handler("stats")(stats_command)))
+    application.add_handler(CommandHandler("help", track_handler("help")(help_command)))
+    application.add_handler(CommandHandler("recount", track_handler("recount")(recount_command)))
+    application.add_handler(CommandHandler("tree", track_handler("tree")(tree_command)))
+    application.add_handler(CommandHandler("broadcast", track_handler("broadcast")(broadcast_command)))
+    application.add_handler(CommandHandler("export", track_handler("export")(export_command)))
+    application.add_handler(CallbackQueryHandler(track_handler(button_label)(button_handler)))
+    application.add_error_handler(error_handler)
+    return application
+
+async def serve():
+    """HTTP server va botni bitta event loop'da ishga tushirish"""
+    application = build_application()
+    webhook = BOT_MODE == 'webhook'
+    web_app = create_web_app(
+        application,
+        webhook_path=WEBHOOK_PATH if webhook else None,
+        secret_token=WEBHOOK_SECRET,
+        verifier=verifier,
+        certificate_image=certificate_image,
+        metrics_token=METRICS_TOKEN
+    )
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    async def ensure_schema():
+        await asyncio.to_thread(db.db.ensure_schema)
+        web_app['schema_ready'] = True
+    
+    web_app['schema_ready'] = False
+    runner = await start_web_server(web_app, PORT)
+    try:
+        # Sxema tekshiruvi va bot identifikatsiyasi (get_me) parallel
+        await asyncio.gather(ensure_schema(), application.initialize())
+        async with application:
+            await post_init(application)
+            await application.start()
+            
+            if webhook:
+                # Kutib turgan update'lar saqlanadi - uyg'onish va deploy'da yo'qolmaydi
+                changed = await ensure_webhook(
+                    application.bot,
+                    url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+                    secret_token=WEBHOOK_SECRET,
+                    allowed_updates=ALLOWED_UPDATES
+                )
+                print("🌐 Webhook rejimi" + (" (webhook yangilandi)" if changed else ""))
+            else:
+                await application.updater.start_polling(
+                    drop_pending_updates=True,
+                    allowed_updates=ALLOWED_UPDATES
+                )
+                print("🔄 Polling rejimi")
+            
+            web_app['ready'] = True
+            print(f"✅ Bot tayyor ({time.monotonic() - STARTED_AT:.2f} s)")
+            
+            await stop_event.wait()
+            
+            if application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+            await post_shutdown(application)
+    finally:
+        await runner.cleanup()
+
 # Botni ishga tushirish funksiyasi
 def run_bot():
     """Yagona bot instance ini ishga tushirish"""
     try:
         print("🤖 Bot ishga tushmoqda...")
-        
-        # Yangi event loop yaratish
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Bot application yaratish
-        application = Application.builder().token(BOT_TOKEN).build()
-        
-        # Handlerlar
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("referral", referral_command))
-        application.add_handler(CommandHandler("stats", stats_command))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CallbackQueryHandler(button_handler))
-        application.add_error_handler(error_handler)
-        
-        # Botni ishga tushirish (polling)
-        application.run_polling(
-            drop_pending_updates=True,  # Eski xabarlarni o'chirish
-            allowed_updates=['message', 'callback_query']
-        )
+        asyncio.run(serve())
         
     except Exception as e:
         print(f"❌ Bot xatoligi: {e}")
         logger.error(f"Bot xatoligi: {e}")
 
 if __name__ == "__main__":
-    # PORT ni olish
-    port = int(os.environ.get('PORT', 5000))
-    
-    # Flask ni alohida threadda ishga tushirish
-    flask_thread = threading.Thread(
-        target=lambda: app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
-    )
-    flask_thread.daemon = True
-    flask_thread.start()
-    
-    # Botni ishga tushirishdan oldin biroz kutish
-    time.sleep(2)
-    
-    # Botni ishga tushirish (asosiy threadda)
     run_bot()
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import Forbidden, BadRequest, NetworkError, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Telegram: ~30 xabar/sekund umumiy, bitta chatga ~1 xabar/sekund.
+# Har bir chatga bitta xabar boradi, qayta urinish faqat RetryAfter pauzasidan
+# keyin bo'ladi - shuning uchun chat limiti ham buzilmaydi.
+GLOBAL_RATE = 25
+WORKERS = 8
+BATCH_SIZE = 200
+# Faqat vaqtinchalik tarmoq xatolari uchun; RetryAfter cheklanmaydi
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+
+class TokenBucket:
+    """Asyncio token bucket. pause() - RetryAfter kelganda hamma workerlarni to'xtatadi"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class Broadcaster:
+    """Barcha foydalanuvchilarga xabar yuborish.
+
+    user_id lar DB dan partiyalab o'qiladi, workerlar umumiy token bucket
+    orqali yuboradi. Har bir partiyadan keyin progress saqlanadi, shuning uchun
+    to'xtab qolgan broadcast oxirgi tugallangan partiyadan davom etadi.
+    """
+
+    def __init__(self, bot, db, rate=GLOBAL_RATE, workers=WORKERS, batch_size=BATCH_SIZE):
+        self.bot = bot
+        self.db = db
+        self.bucket = TokenBucket(rate)
+        self.workers = workers
+        self.batch_size = batch_size
+
+    async def run(self, broadcast):
+        after = broadcast.last_user_id or 0
+        sent, failed = broadcast.sent or 0, broadcast.failed or 0
+        logger.info(f"Broadcast #{broadcast.id} boshlandi (user_id > {after})")
+
+        while True:
+            user_ids = await self.db.get_user_ids_after(after, self.batch_size)
+            if not user_ids:
+                break
+
+            queue = asyncio.Queue()
+            for user_id in user_ids:
+                queue.put_nowait(user_id)
+            results = await asyncio.gather(
+                *(self._worker(queue, broadcast.text) for _ in range(self.workers))
+            )
+            sent += sum(ok for ok, _ in results)
+            failed += sum(bad for _, bad in results)
+            after = user_ids[-1]
+            await self.db.update_broadcast_progress(broadcast.id, after, sent, failed)
+
+        await self.db.update_broadcast_progress(broadcast.id, after, sent, failed, status='done')
+        logger.info(f"Broadcast #{broadcast.id} tugadi: {sent} yuborildi, {failed} xato")
+        return sent, failed
+
+    async def _worker(self, queue, text):
+        sent = failed = 0
+        while not queue.empty():
+            chat_id = queue.get_nowait()
+            if await self._send(chat_id, text):
+                sent += 1
+            else:
+                failed += 1
+        return sent, failed
+
+    async def _send(self, chat_id, text):
+        attempts = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                return True
+            except RetryAfter as e:
+                # Katta broadcastda flood control kutilgan holat: bucket pauzasi
+                # hamma workerlarni sekinlashtiradi, foydalanuvchi tashlab ketilmaydi
+                logger.warning(f"RetryAfter {e.retry_after}s")
+                self.bucket.pause(float(e.retry_after))
+            except (Forbidden, BadRequest):
+                # Botni bloklagan yoki chat mavjud emas
+                return False
+            except NetworkError as e:
+                attempts += 1
+                logger.warning(f"Broadcast tarmoq xatoligi ({chat_id}, {attempts}/{MAX_RETRIES}): {e}")
+                if attempts >= MAX_RETRIES:
+                    return False
+                await asyncio.sleep(attempts * RETRY_BACKOFF)
+            except TelegramError as e:
+                logger.warning(f"Broadcast xatoligi ({chat_id}): {e}")
+                return False
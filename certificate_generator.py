@@ -1,64 +1,176 @@
-from PIL import Image, ImageDraw, ImageFont
-import qrcode
+# PIL va qrcode funksiyalar ichida import qilinadi - bot jarayoni ularni yuklamaydi,
+# faqat chizish workerlari yuklaydi (tezroq ishga tushish)
+import hashlib
+import io
 import os
+import threading
 from datetime import datetime
 
+TITLE_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+TEXT_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+QR_URL = "https://omp.aistudy.uz/certificate?id={}"
+QR_BOX_SIZE = 5
+QR_BORDER = 2
+# Saqlash formati: JPEG (optimized/progressive) yoki WEBP
+IMAGE_FORMATS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+DEFAULT_FORMAT = 'JPEG'
+DEFAULT_QUALITY = 85
+# Joylashuv (koordinatalar, shriftlar, matn) o'zgarsa oshiriladi - eski sertifikatlar qayta chiziladi
+LAYOUT_VERSION = 1
+
+
+class RenderPlan:
+    """Bir marta tayyorlanadigan statik qism: shablon, fontlar va doimiy matnlar"""
+
+    def __init__(self, template_path):
+        from PIL import Image, ImageDraw, ImageFont
+
+        # .jpg faylni ochish
+        if os.path.exists(template_path):
+            img = Image.open(template_path)
+            # JPG formatida alpha channel bo'lmasligi mumkin, RGB ga o'tkazish
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            img.load()
+        else:
+            # Agar shablon bo'lmasa, oddiy fon yaratish
+            img = Image.new('RGB', (1200, 800), color='white')
+
+        # Fontlarni yuklash
+        try:
+            title_font = ImageFont.truetype(TITLE_FONT_PATH, 60)
+            self.name_font = ImageFont.truetype(TITLE_FONT_PATH, 80)
+            text_font = ImageFont.truetype(TEXT_FONT_PATH, 30)
+        except OSError:
+            title_font = ImageFont.load_default()
+            self.name_font = ImageFont.load_default()
+            text_font = ImageFont.load_default()
+
+        # Doimiy matnlar shablonga oldindan chiziladi
+        draw = ImageDraw.Draw(img)
+        draw.text((600, 150), "CERTIFICATE", fill="#001b3b", font=title_font, anchor="mm")
+        draw.text((600, 350), "This certificate is proudly presented to", fill="#4a5568", font=text_font, anchor="mm")
+        self.base = img
+
+
 class CertificateGenerator:
-    def __init__(self, template_path='template.jpg'):  # .jpg qilib o'zgartirildi
+    def __init__(self, template_path='template.jpg', output_dir=None,
+                 image_format=DEFAULT_FORMAT, quality=DEFAULT_QUALITY):  # .jpg qilib o'zgartirildi
         self.template_path = template_path
-        self.output_dir = os.path.join(os.getcwd(), 'certificates')
+        self.output_dir = output_dir or os.path.join(os.getcwd(), 'certificates')
+        self.image_format = image_format.upper()
+        if self.image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Noma'lum format: {image_format}")
+        self.quality = quality
+        self.extension = IMAGE_FORMATS[self.image_format]
         os.makedirs(self.output_dir, exist_ok=True)
-    
+        self._plan = None
+        self._plan_lock = threading.Lock()
+        self._version = None
+
+    @property
+    def version(self):
+        """Shablon, joylashuv va kodlash sozlamalaridan hash - rasm metama'lumotiga yoziladi"""
+        if self._version is None:
+            digest = hashlib.sha256(
+                f"layout:{LAYOUT_VERSION}:format:{self.image_format}:quality:{self.quality}".encode()
+            )
+            if os.path.exists(self.template_path):
+                with open(self.template_path, 'rb') as f:
+                    digest.update(f.read())
+            self._version = digest.hexdigest()[:16]
+        return self._version
+
+    def output_path(self, certificate_id):
+        return os.path.join(self.output_dir, f"{certificate_id}{self.extension}")
+
+    def is_current(self, certificate_id):
+        """Fayl mavjud va joriy shablon/joylashuv versiyasida chizilganmi"""
+        from PIL import Image
+
+        try:
+            with Image.open(self.output_path(certificate_id)) as img:
+                return img.info.get('comment', img.info.get('xmp')) == self.version.encode()
+        except (OSError, SyntaxError):
+            return False
+
+    @property
+    def plan(self):
+        if self._plan is None:
+            with self._plan_lock:
+                if self._plan is None:
+                    self._plan = RenderPlan(self.template_path)
+        return self._plan
+
+    @staticmethod
+    def display_name(user_data):
+        """User obyekti yoki (user_id, username, first_name, ...) tuple dan ism"""
+        if isinstance(user_data, (tuple, list)):
+            user_id, first_name = user_data[0], user_data[2]
+        else:
+            user_id, first_name = user_data.user_id, user_data.first_name
+        return first_name or f"User {user_id}"
+
+    @staticmethod
+    def make_qr(certificate_id):
+        """QR matritsasidan to'g'ridan-to'g'ri rasm yasash (modul-ma-modul chizmasdan)"""
+        import qrcode
+        from PIL import Image
+
+        qr = qrcode.QRCode(version=1, box_size=QR_BOX_SIZE, border=QR_BORDER)
+        qr.add_data(QR_URL.format(certificate_id))
+        qr.make(fit=True)
+        matrix = qr.get_matrix()
+        size = len(matrix)
+        pixels = bytes(0 if cell else 255 for row in matrix for cell in row)
+        qr_img = Image.frombytes('L', (size, size), pixels)
+        return qr_img.resize((size * QR_BOX_SIZE, size * QR_BOX_SIZE), Image.NEAREST)
+
+    def render(self, user_data, certificate_id):
+        """Tayyor sertifikat rasmi (PIL Image)"""
+        from PIL import ImageDraw
+
+        plan = self.plan
+        img = plan.base.copy()
+        draw = ImageDraw.Draw(img)
+        draw.text((600, 430), self.display_name(user_data), fill="#001b3b", font=plan.name_font, anchor="mm")
+        img.paste(self.make_qr(certificate_id), (50, 50))
+        return img
+
+    def save_image(self, img, fp):
+        """Sozlangan formatda kodlash, versiya hash i bilan"""
+        if self.image_format == 'JPEG':
+            img.save(fp, 'JPEG', quality=self.quality, optimize=True, progressive=True,
+                     comment=self.version.encode())
+        else:
+            img.save(fp, 'WEBP', quality=self.quality, method=4, xmp=self.version.encode())
+
+    def encode(self, user_data, certificate_id):
+        """Tayyor sertifikat baytlari (diskka yozmasdan)"""
+        buffer = io.BytesIO()
+        self.save_image(self.render(user_data, certificate_id), buffer)
+        return buffer.getvalue()
+
+    def render_bytes(self, user_data, certificate_id):
+        """Sertifikat baytlari; nusxasi output_dir ga ham yoziladi"""
+        data = self.encode(user_data, certificate_id)
+        with open(self.output_path(certificate_id), 'wb') as f:
+            f.write(data)
+        return data
+
     def generate(self, user_data, certificate_id):
         try:
-            # .jpg faylni ochish
-            if os.path.exists(self.template_path):
-                img = Image.open(self.template_path)
-                # JPG formatida alpha channel bo'lmasligi mumkin, RGB ga o'tkazish
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-            else:
-                # Agar shablon bo'lmasa, oddiy fon yaratish
-                img = Image.new('RGB', (1200, 800), color='white')
-            
-            draw = ImageDraw.Draw(img)
-            
-            # Fontlarni yuklash
-            try:
-                title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 60)
-                name_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 80)
-                text_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 30)
-            except:
-                title_font = ImageFont.load_default()
-                name_font = ImageFont.load_default()
-                text_font = ImageFont.load_default()
-            
-            # Sertifikat matnini yozish
-            draw.text((600, 150), "CERTIFICATE", fill="#001b3b", font=title_font, anchor="mm")
-            
-            name = user_data[2] or f"User {user_data[0]}"
-            draw.text((600, 350), "This certificate is proudly presented to", fill="#4a5568", font=text_font, anchor="mm")
-            draw.text((600, 430), name, fill="#001b3b", font=name_font, anchor="mm")
-            
-            # QR Code yaratish
-            qr = qrcode.QRCode(version=1, box_size=5, border=2)
-            qr.add_data(f"https://omp.aistudy.uz/certificate?id={certificate_id}")
-            qr.make(fit=True)
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            
-            # QR kodni JPG ga moslab qo'yish
-            qr_img = qr_img.convert('RGB')
-            img.paste(qr_img, (50, 50))
-            
-            # Natijani JPG sifatida saqlash
-            output_path = os.path.join(self.output_dir, f"{certificate_id}.jpg")
-            img.save(output_path, 'JPEG', quality=95)
-            
+            img = self.render(user_data, certificate_id)
+
+            # Natijani sozlangan formatda saqlash
+            output_path = self.output_path(certificate_id)
+            self.save_image(img, output_path)
+
             return output_path
-            
+
         except Exception as e:
             print(f"Sertifikat yaratishda xatolik: {e}")
             fallback_path = os.path.join(self.output_dir, f"{certificate_id}.txt")
             with open(fallback_path, 'w') as f:
-                f.write(f"Certificate ID: {certificate_id}\nName: {user_data[2]}")
+                f.write(f"Certificate ID: {certificate_id}\nName: {self.display_name(user_data)}")
             return fallback_path
@@ -0,0 +1,120 @@
+import os
+import threading
+from collections import OrderedDict
+
+CONTENT_TYPES = {'.jpg': 'image/jpeg', '.webp': 'image/webp'}
+
+
+class CertificateStore:
+    """Hajmi cheklangan sertifikat fayllari ombori (LRU).
+
+    Byudjetdan oshsa eng uzoq ishlatilmagan fayllar o'chiriladi; o'chirilgan
+    sertifikat so'ralganda chaqiruvchi uni DB ma'lumotidan qayta chizadi.
+    Indeks fayl nomi bo'yicha va barcha formatlarni o'z ichiga oladi: format
+    almashtirilgandan (JPEG -> WEBP) keyin eski fayllar ham byudjetga kiradi
+    va birinchi bo'lib o'chiriladi. Threadlardan (asyncio.to_thread)
+    chaqiriladi, shuning uchun lock bilan.
+    """
+
+    def __init__(self, directory, max_bytes, extension='.jpg'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.content_type = CONTENT_TYPES[extension]
+        self._lock = threading.Lock()
+        self._files = None  # fayl nomi -> hajm, eng eskisi boshida
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _load(self):
+        """Mavjud fayllarni oxirgi foydalanish vaqti bo'yicha indekslash (bir marta)"""
+        if self._files is not None:
+            return
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and os.path.splitext(entry.name)[1] in CONTENT_TYPES:
+                    stat = entry.stat()
+                    entries.append((max(stat.st_atime, stat.st_mtime), entry.name, stat.st_size))
+        entries.sort()
+        self._files = OrderedDict((name, size) for _, name, size in entries)
+        self.total_bytes = sum(self._files.values())
+        self._evict()
+
+    def path(self, certificate_id):
+        return os.path.join(self.directory, f"{certificate_id}{self.extension}")
+
+    def get(self, certificate_id):
+        """Fayl baytlari yoki None (o'chirilgan/hali yo'q)"""
+        name = f"{certificate_id}{self.extension}"
+        with self._lock:
+            self._load()
+            if name not in self._files and not self._adopt(name):
+                self.misses += 1
+                return None
+            self._files.move_to_end(name)
+            self.hits += 1
+        try:
+            with open(self.path(certificate_id), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(name)
+            return None
+
+    def _adopt(self, name):
+        """Boshqa jarayon (backfill) yozgan faylni indeksga qo'shish"""
+        try:
+            size = os.stat(os.path.join(self.directory, name)).st_size
+        except FileNotFoundError:
+            return False
+        self._files[name] = size
+        self.total_bytes += size
+        self._evict()
+        return name in self._files
+
+    def put(self, certificate_id, data):
+        """Atomar yozish: o'quvchilar hech qachon chala faylni ko'rmaydi"""
+        path = self.path(certificate_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        name = os.path.basename(path)
+        with self._lock:
+            self._load()
+            self._forget(name)
+            self._files[name] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _forget(self, name):
+        size = self._files.pop(name, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'files': len(self._files or ()),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
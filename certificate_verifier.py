@@ -0,0 +1,107 @@
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# generate_certificate_id formati: CERT-YYYYMM-XXXXXXXX
+CERTIFICATE_ID_RE = re.compile(r'^CERT-\d{6}-[A-Z0-9]{8}$')
+
+NOT_FOUND = object()
+
+# Boshqa instance (deploy paytida eskisi) bergan sertifikatlarni olish uchun
+REFRESH_INTERVAL = 60  # sekund
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+class CertificateVerifier:
+    """QR skanerlaridan keladigan sertifikat tekshiruvlari uchun kesh.
+
+    Topilgan sertifikatlar o'zgarmaydi, shuning uchun uzoq saqlanadi.
+    Berilgan barcha certificate_id lar to'plami ishga tushganda yuklanadi
+    (warm) va har bir claim da to'ldiriladi: to'plamda yo'q ID (skanerlar
+    yuboradigan tasodifiy, formatga mos ID lar ham) DB ga bormaydi. Warm
+    tugaguncha topilmaganlar qisqa muddat salbiy keshlanadi. lookup faqat
+    event loop'dan chaqiriladi.
+    """
+
+    def __init__(self, db, maxsize=50000, negative_maxsize=50000, negative_ttl=60,
+                 refresh_interval=REFRESH_INTERVAL):
+        self.db = db
+        self.maxsize = maxsize
+        self.negative_maxsize = negative_maxsize
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval
+        self._found = OrderedDict()  # certificate_id -> dict
+        self._missing = OrderedDict()  # certificate_id -> expires_at
+        self._issued = set()
+        self.warmed = False
+        self._refreshed_at = 0
+        self._refreshed_since = None
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        # claim_certificate DB thread'ida chaqiradi - set.add atomar
+        db.db.claim_listeners.append(self.add_issued)
+
+    def add_issued(self, record):
+        self._issued.add(record.certificate_id)
+
+    async def warm(self):
+        """Berilgan barcha certificate_id larni yuklash"""
+        self._refreshed_since = datetime.now() - REFRESH_OVERLAP
+        self._refreshed_at = time.monotonic()
+        self._issued.update(await self.db.get_certificate_ids())
+        self.warmed = True
+
+    async def _refresh(self):
+        """To'plamda yo'q ID kelganda - boshqa instance bergan yangi sertifikatlar.
+        refresh_interval da ko'pi bilan bir marta, faqat oxirgi yangilanishdan beri berilganlar"""
+        now = time.monotonic()
+        if now - self._refreshed_at < self.refresh_interval:
+            return
+        self._refreshed_at = now
+        since, self._refreshed_since = self._refreshed_since, datetime.now() - REFRESH_OVERLAP
+        self._issued.update(await self.db.get_certificate_ids(claimed_since=since))
+
+    def _cached(self, certificate_id):
+        record = self._found.get(certificate_id)
+        if record is not None:
+            self._found.move_to_end(certificate_id)
+            return record
+        expires_at = self._missing.get(certificate_id)
+        if expires_at is not None and expires_at > time.monotonic():
+            return NOT_FOUND
+        return None
+
+    def _remember(self, certificate_id, record):
+        if record is None:
+            self._missing[certificate_id] = time.monotonic() + self.negative_ttl
+            self._missing.move_to_end(certificate_id)
+            if len(self._missing) > self.negative_maxsize:
+                self._missing.popitem(last=False)
+        else:
+            self._missing.pop(certificate_id, None)
+            self._found[certificate_id] = record
+            if len(self._found) > self.maxsize:
+                self._found.popitem(last=False)
+
+    async def lookup(self, certificate_id):
+        """Sertifikat ma'lumotlari (dict) yoki None"""
+        if not certificate_id or not CERTIFICATE_ID_RE.match(certificate_id):
+            return None
+
+        cached = self._cached(certificate_id)
+        if cached is not None:
+            self.hits += 1
+            return None if cached is NOT_FOUND else cached
+
+        if self.warmed and certificate_id not in self._issued:
+            await self._refresh()
+            if certificate_id not in self._issued:
+                self.rejected += 1
+                return None
+
+        self.misses += 1
+        record = await self.db.get_certificate(certificate_id)
+        self._remember(certificate_id, record)
+        return record
@@ -1,4 +1,5 @@
 import os
+import hashlib
 
 # Render environment variables
 BOT_TOKEN = os.environ.get('BOT_TOKEN')
@@ -7,4 +8,27 @@ if not BOT_TOKEN:
 
 # Admin IDs (space separated string -> list)
 admin_ids_str = os.environ.get('ADMIN_IDS', '')
-ADMIN_IDS = [int(id.strip()) for id in admin_ids_str.split(',') if id.strip()]
\ No newline at end of file
+ADMIN_IDS = [int(id.strip()) for id in admin_ids_str.split(',') if id.strip()]
+
+# Ishga tushirish rejimi: polling (lokal ishlab chiqish) yoki webhook (Render)
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+PORT = int(os.environ.get('PORT', 5000))
+
+# Sertifikat fayllari: format (JPEG/WEBP), sifat va disk byudjeti (render.yaml da 1 GB)
+CERT_FORMAT = os.environ.get('CERT_FORMAT', 'JPEG').upper()
+CERT_QUALITY = int(os.environ.get('CERT_QUALITY', 85))
+CERT_STORE_MAX_MB = int(os.environ.get('CERT_STORE_MAX_MB', 900))
+# Render jarayonlari soni; berilmasa jarayonga ruxsat berilgan yadrolar soni
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 0)) or None
+
+# Bir vaqtda qayta ishlanadigan updatelar chegarasi
+MAX_CONCURRENT_UPDATES = int(os.environ.get('MAX_CONCURRENT_UPDATES', 32))
+
+# Render tashqi manzilni RENDER_EXTERNAL_URL orqali o'zi beradi
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL') or os.environ.get('RENDER_EXTERNAL_URL')
+WEBHOOK_PATH = '/telegram'
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or hashlib.sha256(BOT_TOKEN.encode()).hexdigest()
+# /metrics uchun Bearer token; berilmasa endpoint ochilmaydi (Render URL ochiq)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL environment variable is not set!")
\ No newline at end of file
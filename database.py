@@ -1,11 +1,24 @@
 import os
-from datetime import datetime
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import random
 import string
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, BigInteger, Text, inspect
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, BigInteger, Text, Index, inspect
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy import text, tuple_, func, select, update, literal, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from migrations import MIGRATION_LOCK_KEY, REFERRAL_TREE_REBUILD, run_migrations
+from user_cache import UserCache, MISS, to_record
+from metrics import DB_QUERY_SECONDS, InstrumentedQueuePool
+
+REFERRALS_PAGE_SIZE = 20
+REQUIRED_REFERRALS = 10
+TREE_LEVELS_SHOWN = 10
 
 Base = declarative_base()
 
@@ -18,7 +31,7 @@ class User(Base):
     first_name = Column(String(255))
     referral_code = Column(String(50), unique=True)
     referred_by = Column(BigInteger, nullable=True)
-    referrals_count = Column(Integer, default=0)
+    referrals_count = Column(Integer, default=0, index=True)
     certificate_claimed = Column(Integer, default=0)
     certificate_id = Column(String(100), unique=True, nullable=True)
     claimed_date = Column(DateTime, nullable=True)
@@ -31,9 +44,70 @@ class Referral(Base):
     referrer_id = Column(BigInteger)
     referred_id = Column(BigInteger, unique=True)
     created_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        Index('ix_referrals_referrer_created', 'referrer_id', 'created_at', 'id'),
+    )
+
+class ReferralPath(Base):
+    """Referal daraxti uchun closure jadval: har bir ajdod -> avlod juftligi.
+    depth=1 - to'g'ridan-to'g'ri taklif, 2 - taklif qilinganning taklifi va h.k."""
+    __tablename__ = 'referral_paths'
+    
+    ancestor_id = Column(BigInteger, primary_key=True)
+    depth = Column(Integer, primary_key=True)
+    descendant_id = Column(BigInteger, primary_key=True)
+    
+    __table_args__ = (
+        Index('ix_referral_paths_descendant', 'descendant_id'),
+    )
+
+class ReferralTree(Base):
+    """Har bir tugun uchun tayyor yig'indi: daraxtdagi chuqurligi,
+    butun quyi daraxt hajmi va eng uzun zanjir uzunligi"""
+    __tablename__ = 'referral_tree'
+    
+    user_id = Column(BigInteger, primary_key=True)
+    depth = Column(Integer, nullable=False, default=0)
+    descendants = Column(Integer, nullable=False, default=0, index=True)
+    max_depth = Column(Integer, nullable=False, default=0, index=True)
+
+class CertificateFile(Base):
+    __tablename__ = 'certificate_files'
+    
+    # Telegram'ga yuklangan sertifikat rasmining file_id si
+    certificate_id = Column(String(100), primary_key=True)
+    file_id = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+    
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    created_by = Column(BigInteger)
+    status = Column(String(20), default='running')
+    # Shu user_id gacha (shu jumladan) yuborib bo'lingan - to'xtasa shu yerdan davom etadi
+    last_user_id = Column(BigInteger, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.now)
+
+class StatsCounter(Base):
+    __tablename__ = 'stats_counters'
+    
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+class StatsBucket(Base):
+    __tablename__ = 'stats_buckets'
+    
+    metric = Column(String(50), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
 
 class Database:
-    def __init__(self):
+    def __init__(self, ensure_schema=True):
         # Neon DB connection string
         database_url = os.environ.get('DATABASE_URL')
         if not database_url:
@@ -45,33 +119,194 @@ class Database:
         
         self.engine = create_engine(
             database_url,
+            poolclass=InstrumentedQueuePool,
             pool_size=5,
             max_overflow=10,
             pool_pre_ping=True
         )
         
-        # Jadvallarni xavfsiz yaratish (agar mavjud bo'lmasa)
-        self.create_tables_safely()
+        # Jadvallarni xavfsiz yaratish (agar mavjud bo'lmasa) va sxemani yangilash.
+        # Bot buni ishga tushish paytida boshqa ishlar bilan parallel chaqiradi
+        if ensure_schema:
+            self.ensure_schema()
+        
+        # Sessiya yopilgandan keyin ham qaytarilgan obyektlar o'qilishi uchun
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+        
+        # Foydalanuvchi yozuvlari keshi (add_user/claim_certificate yangilaydi)
+        self.cache = UserCache()
         
-        self.Session = sessionmaker(bind=self.engine)
+        # Referal hisoblanganda chaqiriladi: listener(referrer_id, first_name, referrals_count)
+        self.referral_listeners = []
+        # Sertifikat berilganda chaqiriladi: listener(record)
+        self.claim_listeners = []
+        
+        # /tree rebuild paytida yangi referallar daraxtga navbat orqali qo'shiladi
+        self._tree_lock = threading.Lock()
+        self._tree_rebuilding = False
+        self._tree_backlog = []
+    
+    def ensure_schema(self):
+        self.create_tables_safely()
+        run_migrations(self.engine)
     
     def create_tables_safely(self):
         """Jadvallarni xavfsiz yaratish - mavjud bo'lsa, o'chirib tashlamaydi"""
-        inspector = inspect(self.engine)
+        # Jadvallar ro'yxati bitta so'rovda
+        existing = set(inspect(self.engine).get_table_names())
         
         # users jadvali mavjudligini tekshirish
-        if not inspector.has_table('users'):
+        if 'users' not in existing:
             User.__table__.create(self.engine)
             print("✅ users jadvali yaratildi")
         else:
             print("✅ users jadvali allaqachon mavjud")
         
         # referrals jadvali mavjudligini tekshirish
-        if not inspector.has_table('referrals'):
+        if 'referrals' not in existing:
             Referral.__table__.create(self.engine)
             print("✅ referrals jadvali yaratildi")
         else:
             print("✅ referrals jadvali allaqachon mavjud")
+        
+        # Qolgan jadvallar migratsiyalarda (advisory lock ostida) yaratiladi
+    
+    def insert(self, model):
+        """Dialektga mos INSERT (ON CONFLICT qo'llab-quvvatlanadi)"""
+        if self.engine.dialect.name == 'sqlite':
+            return sqlite_insert(model)
+        return pg_insert(model)
+    
+    def recount_stats(self):
+        """Hisoblagichlarni COUNT(*) orqali qayta hisoblash (drift tuzatish)"""
+        with self.engine.begin() as conn:
+            values = {
+                'total_users': conn.execute(select(func.count()).select_from(User)).scalar(),
+                'total_certificates': conn.execute(
+                    select(func.count()).select_from(User).where(User.certificate_claimed == 1)
+                ).scalar(),
+                'total_referrals': conn.execute(select(func.count()).select_from(Referral)).scalar()
+            }
+            for name, value in values.items():
+                stmt = self.insert(StatsCounter).values(name=name, value=value)
+                conn.execute(stmt.on_conflict_do_update(
+                    index_elements=['name'],
+                    set_={'value': stmt.excluded.value}
+                ))
+        return values
+    
+    def _increment_stats(self, session, counters, buckets=()):
+        """Hisoblagichlarni joriy tranzaksiya ichida oshirish.
+        buckets - [(metric, bucket_start), ...] vaqt bo'yicha qatorlar uchun"""
+        session.query(StatsCounter).filter(StatsCounter.name.in_(counters)).update(
+            {StatsCounter.value: StatsCounter.value + 1},
+            synchronize_session=False
+        )
+        for metric, bucket in buckets:
+            stmt = self.insert(StatsBucket).values(metric=metric, bucket=bucket, value=1)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=['metric', 'bucket'],
+                set_={'value': StatsBucket.value + 1}
+            ))
+    
+    def rebuild_referral_tree(self):
+        """Closure jadval va yig'indilarni referrals dan qaytadan qurish (/tree rebuild).
+
+        Migratsiya bilan bir xil advisory lock ostida, ikki instance bir vaqtda
+        qurmaydi. Postgres'da daraxt jadvallari tranzaksiya oxirigacha yozishga
+        yopiladi - boshqa instance lardagi ro'yxatdan o'tishlar kutib turadi.
+        Shu jarayondagi ro'yxatdan o'tishlar kutmaydi: daraxt qismi navbatga
+        yoziladi va qurish tugagach qo'shiladi.
+        """
+        with self._tree_lock:
+            self._tree_rebuilding = True
+        try:
+            with self.engine.begin() as conn:
+                if conn.dialect.name == 'postgresql':
+                    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+                    conn.execute(text("LOCK TABLE referral_paths, referral_tree IN EXCLUSIVE MODE"))
+                for statement in REFERRAL_TREE_REBUILD:
+                    conn.execute(text(statement))
+                nodes = conn.execute(select(func.count()).select_from(ReferralTree)).scalar()
+        finally:
+            self._drain_tree_backlog()
+        return nodes
+    
+    def _drain_tree_backlog(self):
+        """Qurish paytida navbatga tushgan referallarni daraxtga qo'shish.
+        Navbat bo'sh bo'lgandagina qurish rejimidan chiqiladi - ota tugun
+        har doim farzandidan oldin qo'shiladi."""
+        while True:
+            with self._tree_lock:
+                if not self._tree_backlog:
+                    self._tree_rebuilding = False
+                    return
+                backlog, self._tree_backlog = self._tree_backlog, []
+            for referrer_id, user_id in backlog:
+                self._apply_tree_update(referrer_id, user_id)
+    
+    def _defer_tree_update(self, referrer_id, user_id):
+        """add_user commit qilingandan keyin: qurish davom etsa navbatga, aks holda darhol"""
+        with self._tree_lock:
+            if self._tree_rebuilding:
+                self._tree_backlog.append((referrer_id, user_id))
+                return
+        self._apply_tree_update(referrer_id, user_id)
+    
+    def _apply_tree_update(self, referrer_id, user_id):
+        """Qurish o'qigan referrals da bo'lgan referal allaqachon daraxtda - qayta qo'shilmaydi"""
+        session = self.Session()
+        try:
+            present = session.execute(
+                select(ReferralPath.ancestor_id).where(ReferralPath.descendant_id == user_id).limit(1)
+            ).first()
+            if not present:
+                self._add_to_referral_tree(session, referrer_id, user_id)
+            session.commit()
+        except Exception as e:
+            # Navbat to'xtab qolmasin - daraxtni /tree rebuild tuzatadi
+            session.rollback()
+            print(f"Error updating referral tree: {e}")
+        finally:
+            session.close()
+    
+    def _add_to_referral_tree(self, session, referrer_id, user_id):
+        """Yangi referalni daraxtga qo'shish (add_user tranzaksiyasi ichida).
+
+        referrer ning barcha ajdodlari va referrer o'zi yangi tugunning
+        ajdodlari bo'ladi; ularning yig'indilari bitta UPDATE bilan oshiriladi.
+        Har bir ro'yxatdan o'tish uchun ish hajmi faqat chuqurlikka bog'liq.
+        """
+        ancestors = select(
+            ReferralPath.ancestor_id, literal(user_id, BigInteger), ReferralPath.depth + 1
+        ).where(ReferralPath.descendant_id == referrer_id).union_all(
+            select(literal(referrer_id, BigInteger), literal(user_id, BigInteger), literal(1))
+        )
+        # Qo'shilgan qatorlar soni = ajdodlar soni = yangi tugun chuqurligi
+        depth = session.execute(ReferralPath.__table__.insert().from_select(
+            ['ancestor_id', 'descendant_id', 'depth'], ancestors
+        )).rowcount
+        
+        # Ildiz tugun birinchi farzandigacha daraxtda bo'lmaydi
+        session.execute(self.insert(ReferralTree).values(
+            user_id=referrer_id, depth=0, descendants=0, max_depth=0
+        ).on_conflict_do_nothing(index_elements=['user_id']))
+        session.execute(self.insert(ReferralTree).values(
+            user_id=user_id, depth=depth, descendants=0, max_depth=0
+        ))
+        
+        distance = depth - ReferralTree.depth
+        session.execute(
+            update(ReferralTree)
+            .where(ReferralTree.user_id.in_(
+                select(ReferralPath.ancestor_id).where(ReferralPath.descendant_id == user_id)
+            ))
+            .values(
+                descendants=ReferralTree.descendants + 1,
+                max_depth=case((distance > ReferralTree.max_depth, distance), else_=ReferralTree.max_depth)
+            )
+            .execution_options(synchronize_session=False)
+        )
     
     def generate_referral_code(self, user_id):
         code = f"REF{user_id}{''.join(random.choices(string.ascii_uppercase + string.digits, k=5))}"
@@ -82,43 +317,65 @@ class Database:
         return cert_id
     
     def add_user(self, user_id, username, first_name, referred_by=None):
+        """Ro'yxatdan o'tkazish bitta tranzaksiyada.
+
+        users ga INSERT ... ON CONFLICT DO NOTHING RETURNING, referal bo'lsa
+        referrals ga xuddi shunday INSERT va referrals_count = referrals_count + 1
+        atomar UPDATE. Parallel ro'yxatdan o'tishlarda hisob yo'qolmaydi.
+        """
+        cached = self.cache.get_user(user_id)
+        if cached is not MISS:
+            return cached
+        
         session = self.Session()
         try:
-            # Check if user exists
-            existing = session.query(User).filter_by(user_id=user_id).first()
-            if existing:
-                return existing
-            
-            referral_code = self.generate_referral_code(user_id)
-            
-            new_user = User(
+            now = datetime.now()
+            user_stmt = self.insert(User).values(
                 user_id=user_id,
                 username=username,
                 first_name=first_name,
-                referral_code=referral_code,
-                referred_by=referred_by
-            )
-            session.add(new_user)
+                referral_code=self.generate_referral_code(user_id),
+                referred_by=referred_by,
+                created_at=now
+            ).on_conflict_do_nothing(index_elements=['user_id']).returning(User)
+            token = self.cache.fill_token()
+            new_user = session.scalars(user_stmt).first()
+            if new_user is None:
+                # Foydalanuvchi allaqachon mavjud
+                record = to_record(session.query(User).filter_by(user_id=user_id).first())
+                if record:
+                    self.cache.put_user(record, token)
+                return record
+            
+            credited = None
+            deferred_tree = False
+            counters = ['total_users']
             
             # Agar referal orqali kelgan bo'lsa
             if referred_by and referred_by != user_id:
-                # Check if already referred
-                existing_ref = session.query(Referral).filter_by(referred_id=user_id).first()
-                if not existing_ref:
-                    referral = Referral(
-                        referrer_id=referred_by,
-                        referred_id=user_id
-                    )
-                    session.add(referral)
-                    
-                    # Update referrer's count
-                    referrer = session.query(User).filter_by(user_id=referred_by).first()
-                    if referrer:
-                        referrer.referrals_count += 1
+                referral_stmt = self.insert(Referral).values(
+                    referrer_id=referred_by,
+                    referred_id=user_id,
+                    created_at=now
+                ).on_conflict_do_nothing(index_elements=['referred_id']).returning(Referral.id)
+                if session.execute(referral_stmt).first():
+                    counters.append('total_referrals')
+                    if self._tree_rebuilding:
+                        deferred_tree = True
+                    else:
+                        self._add_to_referral_tree(session, referred_by, user_id)
+                    credited = session.execute(
+                        update(User)
+                        .where(User.user_id == referred_by)
+                        .values(referrals_count=User.referrals_count + 1)
+                        .returning(User.user_id, User.first_name, User.referrals_count)
+                        .execution_options(synchronize_session=False)
+                    ).first()
             
+            self._increment_stats(session, counters, [
+                ('registrations', now.replace(minute=0, second=0, microsecond=0))
+            ])
             session.commit()
-            session.refresh(new_user)
-            return new_user
             
         except Exception as e:
             session.rollback()
@@ -126,86 +383,494 @@ class Database:
             return None
         finally:
             session.close()
+        
+        # Ro'yxatdan o'tish commit qilingan - bundan keyingi ishlar natijani o'zgartirmaydi
+        if deferred_tree:
+            self._defer_tree_update(referred_by, user_id)
+        record = to_record(new_user)
+        self.cache.put_user(record)
+        if credited:
+            self.cache.invalidate(credited.user_id)
+            self._notify(self.referral_listeners, *credited)
+        return record
+    
+    @staticmethod
+    def _notify(listeners, *args):
+        """Commit dan keyin listenerlarni chaqirish; birining xatosi boshqalariga
+        va allaqachon saqlangan natijaga ta'sir qilmaydi"""
+        for listener in listeners:
+            try:
+                listener(*args)
+            except Exception as e:
+                print(f"Error in listener {listener!r}: {e}")
     
     def get_user(self, user_id):
+        cached = self.cache.get_user(user_id)
+        if cached is not MISS:
+            return cached
+        return self.load_user(user_id)
+    
+    def load_user(self, user_id):
+        """Keshni chetlab DB dan o'qish va keshga yozish"""
+        token = self.cache.fill_token()
         session = self.Session()
         try:
-            return session.query(User).filter_by(user_id=user_id).first()
+            record = to_record(session.query(User).filter_by(user_id=user_id).first())
         finally:
             session.close()
+        if record:
+            self.cache.put_user(record, token)
+        return record
     
     def get_user_by_referral_code(self, code):
+        user_id, cached = self.cache.get_user_by_code(code)
+        if cached is not MISS:
+            return cached
+        if user_id is not None:
+            return self.load_user(user_id)
+        return self.load_user_by_referral_code(code)
+    
+    def load_user_by_referral_code(self, code):
+        """Keshni chetlab referal kod bo'yicha DB dan o'qish va keshga yozish"""
+        token = self.cache.fill_token()
         session = self.Session()
         try:
-            return session.query(User).filter_by(referral_code=code).first()
+            record = to_record(session.query(User).filter_by(referral_code=code).first())
         finally:
             session.close()
+        if record:
+            self.cache.put_user(record, token)
+        return record
     
-    def get_referrals(self, user_id):
+    def get_referrals(self, user_id, limit=REFERRALS_PAGE_SIZE, after=None, before=None):
+        """Taklif qilinganlarning bitta sahifasi (keyset pagination).
+
+        after/before - (created_at, id) kursori. Sahifa uchun bitta JOIN
+        so'rov bajariladi, referallar soni qancha bo'lishidan qat'i nazar.
+        """
         session = self.Session()
         try:
-            referrals = session.query(Referral).filter_by(referrer_id=user_id).all()
-            result = []
-            for ref in referrals:
-                user = session.query(User).filter_by(user_id=ref.referred_id).first()
-                if user:
-                    result.append((
-                        user.user_id,
-                        user.username,
-                        user.first_name,
-                        ref.created_at
-                    ))
-            return result
+            cursor_key = tuple_(Referral.created_at, Referral.id)
+            query = session.query(
+                Referral.id,
+                User.user_id,
+                User.username,
+                User.first_name,
+                Referral.created_at
+            ).join(User, User.user_id == Referral.referred_id).filter(
+                Referral.referrer_id == user_id
+            )
+            
+            if before:
+                query = query.filter(cursor_key < tuple(before)).order_by(
+                    Referral.created_at.desc(), Referral.id.desc()
+                )
+            else:
+                if after:
+                    query = query.filter(cursor_key > tuple(after))
+                query = query.order_by(Referral.created_at, Referral.id)
+            
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if before:
+                rows.reverse()
+                has_prev, has_next = has_more, True
+            else:
+                has_prev, has_next = after is not None, has_more
+            
+            return {
+                'items': [(r.user_id, r.username, r.first_name, r.created_at) for r in rows],
+                'prev': (rows[0].created_at, rows[0].id) if rows and has_prev else None,
+                'next': (rows[-1].created_at, rows[-1].id) if rows and has_next else None
+            }
         finally:
             session.close()
     
-    def can_claim_certificate(self, user_id):
-        user = self.get_user(user_id)
+    def get_top_referrers(self, limit):
+        """Eng ko'p taklif qilganlar: [(user_id, first_name, referrals_count), ...]"""
+        session = self.Session()
+        try:
+            rows = session.query(User.user_id, User.first_name, User.referrals_count).filter(
+                User.referrals_count > 0
+            ).order_by(User.referrals_count.desc(), User.user_id).limit(limit).all()
+            return [tuple(row) for row in rows]
+        finally:
+            session.close()
+    
+    def get_referral_histogram(self):
+        """[(referrals_count, foydalanuvchilar soni), ...] - reyting o'rinlari uchun"""
+        session = self.Session()
+        try:
+            rows = session.query(User.referrals_count, func.count()).filter(
+                User.referrals_count > 0
+            ).group_by(User.referrals_count).all()
+            return [tuple(row) for row in rows]
+        finally:
+            session.close()
+    
+    def get_user_rank(self, user_id):
+        """(rank, referrals_count) - referrals_count indeksi bo'yicha bitta so'rov"""
+        session = self.Session()
+        try:
+            count = session.query(User.referrals_count).filter_by(user_id=user_id).scalar_subquery()
+            row = session.query(
+                count,
+                session.query(func.count(User.id)).filter(User.referrals_count > count).scalar_subquery()
+            ).first()
+            if row is None or row[0] is None:
+                return None, 0
+            return row[1] + 1, row[0]
+        finally:
+            session.close()
+    
+    def get_referral_tree(self, user_id, levels=TREE_LEVELS_SHOWN):
+        """Foydalanuvchining quyi daraxti: yig'indilar va birinchi `levels`
+        daraja bo'yicha soni. Daraxtda bo'lmasa None"""
+        session = self.Session()
+        try:
+            node = session.get(ReferralTree, user_id)
+            if node is None:
+                return None
+            rows = session.query(ReferralPath.depth, func.count()).filter(
+                ReferralPath.ancestor_id == user_id,
+                ReferralPath.depth <= levels
+            ).group_by(ReferralPath.depth).order_by(ReferralPath.depth).all()
+            return {
+                'depth': node.depth,
+                'descendants': node.descendants,
+                'max_depth': node.max_depth,
+                'levels': [tuple(row) for row in rows]
+            }
+        finally:
+            session.close()
+    
+    def get_top_subtrees(self, limit, by='descendants'):
+        """Eng katta quyi daraxtlar (by='descendants') yoki eng uzun
+        zanjirlar (by='max_depth'): [(user_id, first_name, descendants, max_depth), ...]"""
+        order = ReferralTree.max_depth if by == 'max_depth' else ReferralTree.descendants
+        session = self.Session()
+        try:
+            rows = session.query(
+                ReferralTree.user_id,
+                User.first_name,
+                ReferralTree.descendants,
+                ReferralTree.max_depth
+            ).outerjoin(User, User.user_id == ReferralTree.user_id).order_by(
+                order.desc(), ReferralTree.user_id
+            ).limit(limit).all()
+            return [tuple(row) for row in rows]
+        finally:
+            session.close()
+    
+    @staticmethod
+    def check_claim(user):
+        """Allaqachon o'qilgan foydalanuvchi uchun sertifikat olish shartlari"""
         if not user:
             return False, "Foydalanuvchi topilmadi"
         
         if user.certificate_claimed == 1:
             return False, "Siz allaqachon sertifikat olgansiz"
         
-        if user.referrals_count >= 10:
+        if user.referrals_count >= REQUIRED_REFERRALS:
             return True, "Sertifikat olishingiz mumkin!"
         else:
-            return False, f"Sizga yana {10 - user.referrals_count} ta do'st kerak"
+            return False, f"Sizga yana {REQUIRED_REFERRALS - user.referrals_count} ta do'st kerak"
+    
+    def can_claim_certificate(self, user_id):
+        return self.check_claim(self.get_user(user_id))
+    
+    def claim_certificate(self, user_id, attempts=3):
+        """Sertifikatni bitta shartli UPDATE ... RETURNING bilan berish.
+
+        Shart (certificate_claimed = 0, referrals_count >= 10) UPDATE ning
+        o'zida tekshiriladi, shuning uchun ikki marta bosish ikkita sertifikat
+        bermaydi. Muvaffaqiyatda yangilangan User qaytadi (chizish uchun
+        kerakli hamma narsa bilan). certificate_id to'qnashsa qayta uriniladi.
+        """
+        for attempt in range(attempts):
+            session = self.Session()
+            try:
+                now = datetime.now()
+                user = session.scalars(
+                    update(User)
+                    .where(
+                        User.user_id == user_id,
+                        User.certificate_claimed == 0,
+                        User.referrals_count >= REQUIRED_REFERRALS
+                    )
+                    .values(
+                        certificate_claimed=1,
+                        certificate_id=self.generate_certificate_id(),
+                        claimed_date=now
+                    )
+                    .returning(User)
+                    .execution_options(synchronize_session=False)
+                ).first()
+                if user is None:
+                    session.rollback()
+                    self.cache.invalidate(user_id)
+                    can_claim, message = self.can_claim_certificate(user_id)
+                    return False, message if not can_claim else "Qayta urinib ko'ring"
+                
+                self._increment_stats(session, ['total_certificates'], [
+                    ('claims', now.replace(hour=0, minute=0, second=0, microsecond=0))
+                ])
+                session.commit()
+                
+                record = to_record(user)
+                # Claim dan oldin boshlangan o'qishlar eski yozuvni qaytarib qo'ymasin
+                self.cache.invalidate(user_id)
+                self.cache.put_user(record)
+                self._notify(self.claim_listeners, record)
+                return True, record
+                
+            except IntegrityError:
+                # certificate_id band - boshqa ID bilan qayta urinish
+                session.rollback()
+            except Exception as e:
+                session.rollback()
+                return False, str(e)
+            finally:
+                session.close()
+        
+        return False, "Sertifikat ID yaratib bo'lmadi"
     
-    def claim_certificate(self, user_id):
+    def get_certificate_file_id(self, certificate_id):
         session = self.Session()
         try:
-            can_claim, message = self.can_claim_certificate(user_id)
-            if not can_claim:
-                return False, message
-            
-            cert_id = self.generate_certificate_id()
-            
-            user = session.query(User).filter_by(user_id=user_id).first()
-            user.certificate_claimed = 1
-            user.certificate_id = cert_id
-            user.claimed_date = datetime.now()
-            
+            return session.query(CertificateFile.file_id).filter_by(certificate_id=certificate_id).scalar()
+        finally:
+            session.close()
+    
+    def save_certificate_file_id(self, certificate_id, file_id):
+        stmt = self.insert(CertificateFile).values(certificate_id=certificate_id, file_id=file_id)
+        with self.engine.begin() as conn:
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=['certificate_id'],
+                set_={'file_id': stmt.excluded.file_id}
+            ))
+    
+    def delete_certificate_file_id(self, certificate_id):
+        session = self.Session()
+        try:
+            session.query(CertificateFile).filter_by(certificate_id=certificate_id).delete()
+            session.commit()
+        finally:
+            session.close()
+    
+    def get_user_ids_after(self, after_user_id, limit):
+        """user_id bo'yicha keyset partiya - hammasini xotiraga yuklamasdan aylanib chiqish"""
+        session = self.Session()
+        try:
+            return session.scalars(
+                select(User.user_id).where(User.user_id > after_user_id).order_by(User.user_id).limit(limit)
+            ).all()
+        finally:
+            session.close()
+    
+    def get_certificate(self, certificate_id):
+        """Tekshiruv sahifasi uchun ochiq ma'lumotlar (certificate_id unique indeksi bo'yicha)"""
+        session = self.Session()
+        try:
+            row = session.query(User.user_id, User.first_name, User.claimed_date).filter(
+                User.certificate_id == certificate_id
+            ).first()
+        finally:
+            session.close()
+        if row is None:
+            return None
+        return {
+            'certificate_id': certificate_id,
+            'name': row.first_name or f"User {row.user_id}",
+            'claimed_date': row.claimed_date.isoformat() if row.claimed_date else None
+        }
+    
+    def get_certificate_ids(self, claimed_since=None):
+        """Berilgan certificate_id lar (claimed_since dan beri yoki hammasi)"""
+        session = self.Session()
+        try:
+            query = session.query(User.certificate_id).filter(User.certificate_claimed == 1)
+            if claimed_since is not None:
+                query = query.filter(User.claimed_date >= claimed_since)
+            return [row.certificate_id for row in query]
+        finally:
+            session.close()
+    
+    def get_claimed_certificates(self, after_id, limit):
+        """Sertifikat olganlar partiyasi (users.id bo'yicha keyset):
+        [(id, user_id, username, first_name, certificate_id), ...]"""
+        session = self.Session()
+        try:
+            rows = session.query(
+                User.id, User.user_id, User.username, User.first_name, User.certificate_id
+            ).filter(User.certificate_claimed == 1, User.id > after_id).order_by(User.id).limit(limit).all()
+            return [tuple(row) for row in rows]
+        finally:
+            session.close()
+    
+    def create_broadcast(self, text, created_by):
+        session = self.Session()
+        try:
+            broadcast = Broadcast(text=text, created_by=created_by, status='running', last_user_id=0, sent=0, failed=0)
+            session.add(broadcast)
+            session.commit()
+            return broadcast
+        finally:
+            session.close()
+    
+    def get_unfinished_broadcasts(self):
+        session = self.Session()
+        try:
+            return session.query(Broadcast).filter_by(status='running').order_by(Broadcast.id).all()
+        finally:
+            session.close()
+    
+    def update_broadcast_progress(self, broadcast_id, last_user_id, sent, failed, status=None):
+        values = {'last_user_id': last_user_id, 'sent': sent, 'failed': failed}
+        if status:
+            values['status'] = status
+        session = self.Session()
+        try:
+            session.query(Broadcast).filter_by(id=broadcast_id).update(values)
             session.commit()
-            return True, cert_id
-            
-        except Exception as e:
-            session.rollback()
-            return False, str(e)
         finally:
             session.close()
     
     def get_stats(self):
+        """Saqlangan hisoblagichlardan statistika - COUNT(*) skanersiz"""
         session = self.Session()
         try:
-            total_users = session.query(User).count()
-            total_certificates = session.query(User).filter_by(certificate_claimed=1).count()
-            total_referrals = session.query(Referral).count()
+            stats = {'total_users': 0, 'total_certificates': 0, 'total_referrals': 0}
+            stats.update(session.query(StatsCounter.name, StatsCounter.value).all())
             
-            return {
-                'total_users': total_users,
-                'total_certificates': total_certificates,
-                'total_referrals': total_referrals
-            }
+            now = datetime.now()
+            stats['registrations_24h'] = self._sum_buckets(session, 'registrations', now - timedelta(hours=24))
+            stats['claims_7d'] = self._sum_buckets(session, 'claims', now - timedelta(days=7))
+            return stats
         finally:
             session.close()
+    
+    def _sum_buckets(self, session, metric, since):
+        return session.query(func.coalesce(func.sum(StatsBucket.value), 0)).filter(
+            StatsBucket.metric == metric,
+            StatsBucket.bucket >= since
+        ).scalar()
+    
+    def get_stats_series(self, metric, since):
+        """Vaqt bo'yicha qator: [(bucket_start, value), ...]"""
+        session = self.Session()
+        try:
+            rows = session.query(StatsBucket.bucket, StatsBucket.value).filter(
+                StatsBucket.metric == metric,
+                StatsBucket.bucket >= since
+            ).order_by(StatsBucket.bucket).all()
+            return [tuple(row) for row in rows]
+        finally:
+            session.close()
+
+class AsyncDatabase:
+    """Database metodlarining async varianti.
+
+    Har bir so'rov cheklangan thread pool'da bajariladi, shuning uchun
+    handlerlar psycopg2 round trip'ini kutayotganda event loop bloklanmaydi.
+    Pool hajmi engine'ning ulanishlar soniga teng.
+    """
+
+    def __init__(self, database=None, max_workers=None):
+        self.db = database or Database()
+        if max_workers is None:
+            pool = self.db.engine.pool
+            size = pool.size() if hasattr(pool, 'size') else 5
+            max_workers = size + max(getattr(pool, '_max_overflow', 0), 0)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers),
+            thread_name_prefix='db'
+        )
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with DB_QUERY_SECONDS.labels(func.__name__).time():
+            return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+
+    async def add_user(self, user_id, username, first_name, referred_by=None):
+        return await self._run(self.db.add_user, user_id, username, first_name, referred_by)
+
+    async def get_user(self, user_id):
+        # Keshda bo'lsa thread pool'ga o'tmasdan qaytarish
+        cached = self.db.cache.get_user(user_id)
+        if cached is not MISS:
+            return cached
+        return await self._run(self.db.load_user, user_id)
+
+    async def get_user_by_referral_code(self, code):
+        # get_user kabi: keshda bo'lsa thread pool'ga o'tmasdan qaytarish
+        user_id, cached = self.db.cache.get_user_by_code(code)
+        if cached is not MISS:
+            return cached
+        if user_id is not None:
+            return await self._run(self.db.load_user, user_id)
+        return await self._run(self.db.load_user_by_referral_code, code)
+
+    async def get_referrals(self, user_id, limit=REFERRALS_PAGE_SIZE, after=None, before=None):
+        return await self._run(self.db.get_referrals, user_id, limit, after, before)
+
+    async def get_top_referrers(self, limit):
+        return await self._run(self.db.get_top_referrers, limit)
+
+    async def get_user_rank(self, user_id):
+        return await self._run(self.db.get_user_rank, user_id)
+
+    async def get_referral_tree(self, user_id, levels=TREE_LEVELS_SHOWN):
+        return await self._run(self.db.get_referral_tree, user_id, levels)
+
+    async def get_top_subtrees(self, limit, by='descendants'):
+        return await self._run(self.db.get_top_subtrees, limit, by)
+
+    async def rebuild_referral_tree(self):
+        return await self._run(self.db.rebuild_referral_tree)
+
+    async def can_claim_certificate(self, user_id):
+        return await self._run(self.db.can_claim_certificate, user_id)
+
+    async def claim_certificate(self, user_id):
+        return await self._run(self.db.claim_certificate, user_id)
+
+    async def get_certificate(self, certificate_id):
+        return await self._run(self.db.get_certificate, certificate_id)
+
+    async def get_certificate_ids(self, claimed_since=None):
+        return await self._run(self.db.get_certificate_ids, claimed_since)
+
+    async def get_certificate_file_id(self, certificate_id):
+        return await self._run(self.db.get_certificate_file_id, certificate_id)
+
+    async def save_certificate_file_id(self, certificate_id, file_id):
+        return await self._run(self.db.save_certificate_file_id, certificate_id, file_id)
+
+    async def delete_certificate_file_id(self, certificate_id):
+        return await self._run(self.db.delete_certificate_file_id, certificate_id)
+
+    async def get_user_ids_after(self, after_user_id, limit):
+        return await self._run(self.db.get_user_ids_after, after_user_id, limit)
+
+    async def create_broadcast(self, text, created_by):
+        return await self._run(self.db.create_broadcast, text, created_by)
+
+    async def get_unfinished_broadcasts(self):
+        return await self._run(self.db.get_unfinished_broadcasts)
+
+    async def update_broadcast_progress(self, broadcast_id, last_user_id, sent, failed, status=None):
+        return await self._run(self.db.update_broadcast_progress, broadcast_id, last_user_id, sent, failed, status)
+
+    async def get_stats(self):
+        return await self._run(self.db.get_stats)
+
+    async def get_stats_series(self, metric, since):
+        return await self._run(self.db.get_stats_series, metric, since)
+
+    async def recount_stats(self):
+        return await self._run(self.db.recount_stats)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,97 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from database import Database, User, Referral
+
+FETCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+KINDS = ('users', 'referrals', 'referrals_joined', 'certificates')
+
+
+def build_query(kind):
+    """Eksport turi bo'yicha SELECT"""
+    if kind == 'users':
+        return select(
+            User.user_id, User.username, User.first_name, User.referral_code, User.referred_by,
+            User.referrals_count, User.certificate_claimed, User.certificate_id,
+            User.claimed_date, User.created_at
+        ).order_by(User.id)
+    if kind == 'referrals':
+        return select(
+            Referral.id, Referral.referrer_id, Referral.referred_id, Referral.created_at
+        ).order_by(Referral.id)
+    if kind == 'referrals_joined':
+        referrer = aliased(User)
+        referred = aliased(User)
+        return select(
+            Referral.id,
+            Referral.referrer_id,
+            referrer.username.label('referrer_username'),
+            referrer.first_name.label('referrer_first_name'),
+            Referral.referred_id,
+            referred.username.label('referred_username'),
+            referred.first_name.label('referred_first_name'),
+            Referral.created_at
+        ).outerjoin(referrer, referrer.user_id == Referral.referrer_id).outerjoin(
+            referred, referred.user_id == Referral.referred_id
+        ).order_by(Referral.id)
+    if kind == 'certificates':
+        return select(
+            User.user_id, User.username, User.first_name, User.certificate_id, User.claimed_date
+        ).where(User.certificate_claimed == 1).order_by(User.claimed_date)
+    raise ValueError(f"Noma'lum eksport turi: {kind}")
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export(engine, kind, fmt, path):
+    """Jadvalni server-side cursor orqali gzip faylga oqim bilan yozish.
+    Xotira sarfi qatorlar soniga bog'liq emas. Yozilgan qatorlar sonini qaytaradi."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Noma'lum format: {fmt}")
+
+    rows = 0
+    with engine.connect() as conn, gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        result = conn.execution_options(stream_results=True, yield_per=FETCH_SIZE).execute(build_query(kind))
+        columns = list(result.keys())
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in result:
+                writer.writerow(row)
+                rows += 1
+        else:
+            for row in result:
+                f.write(json.dumps(dict(zip(columns, map(_json_value, row))), ensure_ascii=False))
+                f.write('\n')
+                rows += 1
+    return rows
+
+
+def export_filename(kind, fmt):
+    return f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}.gz"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Foydalanuvchilar, referallar va sertifikatlarni eksport qilish")
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('-o', '--output', help="Chiqish fayli (.gz)")
+    args = parser.parse_args()
+
+    path = args.output or export_filename(args.kind, args.format)
+    rows = export(Database().engine, args.kind, args.format, path)
+    print(f"✅ {rows} qator yozildi: {os.path.abspath(path)}")
+
+
+if __name__ == '__main__':
+    main()
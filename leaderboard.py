@@ -0,0 +1,103 @@
+import asyncio
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_SIZE = 10
+RECONCILE_INTERVAL = 300  # sekund
+
+
+class Leaderboard:
+    """Xotirada saqlanadigan top-N reyting.
+
+    Ishga tushganda DB dan to'ldiriladi (warm), har bir referal hisoblanganda
+    Database.add_user orqali yangilanadi va vaqti-vaqti bilan DB bilan
+    solishtiriladi (reconcile). Tugma bosilganda DB ga so'rov yuborilmaydi.
+    Buferdan tashqaridagilar o'rni referrals_count gistogrammasidan olinadi.
+    """
+
+    def __init__(self, db, size=LEADERBOARD_SIZE, capacity=None):
+        self.db = db
+        self.size = size
+        # Ko'rsatiladigan qismdan kattaroq bufer - kirib-chiqishlar uchun zaxira
+        self.capacity = capacity or size * 5
+        self._lock = threading.Lock()
+        self._entries = {}  # user_id -> (referrals_count, first_name)
+        self._ranked = []
+        self._histogram = {}  # referrals_count -> foydalanuvchilar soni (faqat > 0)
+        self._counts = []  # gistogramma kalitlari, o'sish tartibida
+        self._above = []  # _above[i] - referrals_count >= _counts[i] bo'lganlar soni
+        self._histogram_dirty = False
+        db.referral_listeners.append(self.record_referral)
+
+    def warm(self):
+        """Top ro'yxatni DB dan qayta yuklash"""
+        rows = self.db.get_top_referrers(self.capacity)
+        histogram = dict(self.db.get_referral_histogram())
+        with self._lock:
+            self._entries = {user_id: (count, name) for user_id, name, count in rows}
+            self._rebuild()
+            self._histogram = histogram
+            self._histogram_dirty = True
+        logger.info(f"Reyting yangilandi: {len(rows)} ta foydalanuvchi")
+
+    def record_referral(self, user_id, first_name, referrals_count):
+        with self._lock:
+            # Foydalanuvchi referrals_count - 1 dan referrals_count ga o'tdi
+            previous = referrals_count - 1
+            if self._histogram.get(previous, 0) > 1:
+                self._histogram[previous] -= 1
+            else:
+                self._histogram.pop(previous, None)
+            self._histogram[referrals_count] = self._histogram.get(referrals_count, 0) + 1
+            self._histogram_dirty = True
+
+            if user_id not in self._entries and len(self._entries) >= self.capacity:
+                if referrals_count <= self._ranked[-1][1]:
+                    return
+                del self._entries[self._ranked[-1][0]]
+            self._entries[user_id] = (referrals_count, first_name)
+            self._rebuild()
+
+    def _rebuild(self):
+        self._ranked = sorted(
+            ((user_id, count, name) for user_id, (count, name) in self._entries.items()),
+            key=lambda entry: (-entry[1], entry[0])
+        )
+
+    def top(self, limit=None):
+        """[(user_id, referrals_count, first_name), ...]"""
+        with self._lock:
+            return self._ranked[:limit or self.size]
+
+    def rank_in_memory(self, user_id):
+        """Foydalanuvchi buferda bo'lsa, uning o'rni; aks holda None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            # Buferdan tashqaridagilar eng kichik qiymatdan oshmaydi
+            if len(self._entries) >= self.capacity and entry[0] <= self._ranked[-1][1]:
+                return None
+            return 1 + sum(1 for _, count, _ in self._ranked if count > entry[0])
+
+    def rank_for_count(self, referrals_count):
+        """referrals_count ga ega foydalanuvchining o'rni: 1 + undan ko'p taklif qilganlar"""
+        with self._lock:
+            if self._histogram_dirty:
+                self._counts = sorted(self._histogram)
+                self._above = [0] * (len(self._counts) + 1)
+                for i in range(len(self._counts) - 1, -1, -1):
+                    self._above[i] = self._above[i + 1] + self._histogram[self._counts[i]]
+                self._histogram_dirty = False
+            return 1 + self._above[bisect.bisect_right(self._counts, referrals_count)]
+
+    async def reconcile_forever(self, interval=RECONCILE_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.warm)
+            except Exception as e:
+                logger.error(f"Reytingni yangilashda xatolik: {e}")
@@ -0,0 +1,68 @@
+import functools
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, generate_latest
+from sqlalchemy.pool import QueuePool
+from telegram.request import HTTPXRequest
+
+HANDLER_SECONDS = Histogram(
+    'bot_handler_seconds', 'Handler bajarilish vaqti', ['handler']
+)
+DB_QUERY_SECONDS = Histogram(
+    'bot_db_query_seconds', 'Database metodlari vaqti (thread pool kutishi bilan)', ['method']
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    'bot_db_pool_checkout_seconds', 'SQLAlchemy pool dan ulanish olishni kutish vaqti',
+    buckets=(.0005, .001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+)
+RENDER_SECONDS = Histogram(
+    'bot_certificate_render_seconds', 'Sertifikat chizish vaqti (navbat bilan)'
+)
+RENDER_QUEUE_DEPTH = Gauge(
+    'bot_render_queue_depth', 'Chizilayotgan va navbatdagi sertifikatlar'
+)
+TELEGRAM_API_SECONDS = Histogram(
+    'bot_telegram_api_seconds', 'Telegram Bot API so\'rovlari vaqti', ['method']
+)
+
+
+def track_handler(name):
+    """Handler vaqtini o'lchash. name - satr yoki update dan nom qaytaruvchi funksiya"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update, context):
+            label = name(update) if callable(name) else name
+            start = time.perf_counter()
+            try:
+                return await func(update, context)
+            finally:
+                HANDLER_SECONDS.labels(label).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class InstrumentedQueuePool(QueuePool):
+    """Ulanish olishni kutish vaqtini o'lchaydigan QueuePool"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """Telegram API chaqiruvlari vaqtini metod nomi bo'yicha o'lchash"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            TELEGRAM_API_SECONDS.labels(url.rsplit('/', 1)[-1]).observe(time.perf_counter() - start)
+
+
+def render_latest():
+    """(body, content_type) - /metrics javobi uchun"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,158 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, select, text
+from sqlalchemy.exc import DBAPIError
+
+# Ikki instance bir vaqtda migratsiya qilmasligi uchun Postgres advisory lock kaliti
+MIGRATION_LOCK_KEY = 804812001
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations',
+    metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255)),
+    Column('applied_at', DateTime, default=datetime.now)
+)
+
+# Referal daraxtini (closure jadval + yig'indilar) referrals dan qaytadan qurish.
+# 3-migratsiya va /tree rebuild ikkalasi ham shu buyruqlarni ishlatadi.
+REFERRAL_TREE_REBUILD = [
+    "DELETE FROM referral_tree",
+    "DELETE FROM referral_paths",
+    """WITH RECURSIVE paths (ancestor_id, descendant_id, depth) AS (
+        SELECT referrer_id, referred_id, 1 FROM referrals WHERE referrer_id IS NOT NULL
+        UNION ALL
+        SELECT paths.ancestor_id, referrals.referred_id, paths.depth + 1
+        FROM paths JOIN referrals ON referrals.referrer_id = paths.descendant_id
+    )
+    INSERT INTO referral_paths (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, descendant_id, depth FROM paths""",
+    # Farzandi bor tugunlar: quyi daraxt hajmi va eng uzun zanjir
+    """INSERT INTO referral_tree (user_id, depth, descendants, max_depth)
+    SELECT ancestor_id, 0, count(*), max(depth) FROM referral_paths GROUP BY ancestor_id""",
+    # Barglar: chuqurlik = ajdodlar soni
+    """INSERT INTO referral_tree (user_id, depth, descendants, max_depth)
+    SELECT descendant_id, count(*), 0, 0 FROM referral_paths
+    WHERE NOT EXISTS (SELECT 1 FROM referral_tree WHERE referral_tree.user_id = referral_paths.descendant_id)
+    GROUP BY descendant_id""",
+    # Ichki tugunlarning chuqurligi
+    """UPDATE referral_tree SET depth = (
+        SELECT count(*) FROM referral_paths WHERE referral_paths.descendant_id = referral_tree.user_id
+    ) WHERE descendants > 0""",
+]
+
+# Hisoblagichlar mavjud bo'lmasa COUNT(*) bilan boshlang'ich qiymat (Database.recount_stats bilan bir xil)
+STATS_COUNTER_SEEDS = {
+    'total_users': "SELECT count(*) FROM users",
+    'total_certificates': "SELECT count(*) FROM users WHERE certificate_claimed = 1",
+    'total_referrals': "SELECT count(*) FROM referrals",
+}
+
+# (versiya, tavsif, SQL buyruqlar). Faqat oxiriga qo'shiladi, mavjudlari o'zgartirilmaydi.
+# Dialektlar farq qilsa buyruq {dialect: SQL} ko'rinishida beriladi.
+MIGRATIONS = [
+    (1, "referrals (referrer_id, created_at, id) indeksi", [
+        "CREATE INDEX IF NOT EXISTS ix_referrals_referrer_created ON referrals (referrer_id, created_at, id)"
+    ]),
+    (2, "users.referrals_count indeksi", [
+        "CREATE INDEX IF NOT EXISTS ix_users_referrals_count ON users (referrals_count)"
+    ]),
+    (3, "referral_paths va referral_tree (referal daraxti)", [
+        """CREATE TABLE IF NOT EXISTS referral_paths (
+            ancestor_id BIGINT NOT NULL,
+            depth INTEGER NOT NULL,
+            descendant_id BIGINT NOT NULL,
+            PRIMARY KEY (ancestor_id, depth, descendant_id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_referral_paths_descendant ON referral_paths (descendant_id)",
+        """CREATE TABLE IF NOT EXISTS referral_tree (
+            user_id BIGINT NOT NULL PRIMARY KEY,
+            depth INTEGER NOT NULL DEFAULT 0,
+            descendants INTEGER NOT NULL DEFAULT 0,
+            max_depth INTEGER NOT NULL DEFAULT 0
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_referral_tree_descendants ON referral_tree (descendants)",
+        "CREATE INDEX IF NOT EXISTS ix_referral_tree_max_depth ON referral_tree (max_depth)",
+        *REFERRAL_TREE_REBUILD
+    ]),
+    (4, "certificate_files, broadcasts, stats_buckets va stats_counters", [
+        """CREATE TABLE IF NOT EXISTS certificate_files (
+            certificate_id VARCHAR(100) NOT NULL PRIMARY KEY,
+            file_id VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP
+        )""",
+        {
+            'postgresql': """CREATE TABLE IF NOT EXISTS broadcasts (
+                id SERIAL PRIMARY KEY,
+                text TEXT NOT NULL,
+                created_by BIGINT,
+                status VARCHAR(20),
+                last_user_id BIGINT,
+                sent INTEGER,
+                failed INTEGER,
+                created_at TIMESTAMP
+            )""",
+            'sqlite': """CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY,
+                text TEXT NOT NULL,
+                created_by BIGINT,
+                status VARCHAR(20),
+                last_user_id BIGINT,
+                sent INTEGER,
+                failed INTEGER,
+                created_at TIMESTAMP
+            )""",
+        },
+        """CREATE TABLE IF NOT EXISTS stats_buckets (
+            metric VARCHAR(50) NOT NULL,
+            bucket TIMESTAMP NOT NULL,
+            value BIGINT NOT NULL,
+            PRIMARY KEY (metric, bucket)
+        )""",
+        """CREATE TABLE IF NOT EXISTS stats_counters (
+            name VARCHAR(50) NOT NULL PRIMARY KEY,
+            value BIGINT NOT NULL
+        )""",
+        # Mavjud hisoblagichlarga tegilmaydi - eski instance ular bilan ishlayotgan bo'lishi mumkin
+        *(
+            f"INSERT INTO stats_counters (name, value) SELECT '{name}', ({query}) "
+            f"WHERE NOT EXISTS (SELECT 1 FROM stats_counters WHERE name = '{name}')"
+            for name, query in STATS_COUNTER_SEEDS.items()
+        )
+    ]),
+]
+
+
+def schema_is_current(engine):
+    """Oxirgi migratsiya qo'llanganmi - lock olmasdan bitta so'rov"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(schema_migrations.c.version))).scalar() == MIGRATIONS[-1][0]
+    except DBAPIError:
+        # schema_migrations hali yo'q
+        return False
+
+
+def run_migrations(engine):
+    """Qo'llanmagan migratsiyalarni bitta tranzaksiyada bajarish (idempotent)"""
+    if schema_is_current(engine):
+        return
+    
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            # Tranzaksiya tugaguncha ushlab turiladi
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        schema_migrations.create(conn, checkfirst=True)
+        
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+        for version, description, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            for statement in statements:
+                if isinstance(statement, dict):
+                    statement = statement[conn.dialect.name]
+                conn.execute(text(statement))
+            conn.execute(schema_migrations.insert().values(version=version, description=description))
+            print(f"✅ Migratsiya {version}: {description}")
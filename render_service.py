@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from certificate_generator import CertificateGenerator, DEFAULT_FORMAT, DEFAULT_QUALITY
+from metrics import RENDER_QUEUE_DEPTH, RENDER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Har bir worker jarayonida bitta generator (render plan bilan)
+_generator = None
+
+
+def _init_worker(template_path, image_format, quality):
+    global _generator
+    _generator = CertificateGenerator(template_path=template_path, image_format=image_format, quality=quality)
+    _generator.plan
+
+
+def _render_worker(user_data, certificate_id):
+    return _generator.encode(user_data, certificate_id)
+
+
+def available_cpus():
+    """Jarayonga ruxsat berilgan yadrolar soni (os.cpu_count() - butun host'niki)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity faqat Linux'da
+        return os.cpu_count() or 1
+
+
+class RenderService:
+    """Sertifikatlarni event loop'dan tashqarida, jarayonlar pool'ida chizish.
+
+    Handler render() ni await qiladi va tayyor JPEG baytlarini oladi.
+    Navbat cheklangan: full bo'lsa yangi so'rov qabul qilinmaydi,
+    saturated bo'lsa foydalanuvchiga navbatda ekanligi aytiladi.
+    """
+
+    def __init__(self, template_path='template.jpg', image_format=DEFAULT_FORMAT, quality=DEFAULT_QUALITY,
+                 max_workers=None, max_pending=None):
+        self.max_workers = max_workers or available_cpus()
+        self.max_pending = max_pending or self.max_workers * 4
+        self.pending = 0
+        self.initargs = (template_path, image_format, quality)
+        self.executor = self._create_executor()
+
+    def _create_executor(self):
+        # fork: bot.py modul darajasida DB ulanishini ochadi, spawn/forkserver
+        # esa __main__ ni qayta import qiladi
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=self.initargs
+        )
+
+    def _replace_broken(self, broken):
+        """Worker o'lsa (OOM, PIL segfault) pool butunlay ishlamay qoladi - yangisini yaratish.
+        Parallel so'rovlar bir xil xatoni oladi, pool faqat bir marta almashtiriladi."""
+        if self.executor is broken:
+            logger.warning("Render pool buzildi, qayta yaratilmoqda")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._create_executor()
+
+    def start(self):
+        """Workerlarni darhol ishga tushirish.
+
+        fork konteksti bilan barcha jarayonlar birinchi submit'da yaratiladi,
+        shuning uchun bu boshqa threadlar (DB pool) paydo bo'lishidan oldin
+        chaqirilishi kerak. Workerlar tayyor bo'lishi kutilmaydi.
+        """
+        self.executor.submit(int)
+
+    @property
+    def saturated(self):
+        """Barcha workerlar band - yangi so'rov navbatda kutadi"""
+        return self.pending >= self.max_workers
+
+    @property
+    def full(self):
+        """Navbat to'lgan - yangi so'rovni qabul qilmaslik kerak"""
+        return self.pending >= self.max_pending
+
+    async def render(self, user_data, certificate_id):
+        """Kodlangan rasm baytlari. user_data - (user_id, username, first_name) tuple"""
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        RENDER_QUEUE_DEPTH.set(self.pending)
+        try:
+            with RENDER_SECONDS.time():
+                executor = self.executor
+                try:
+                    return await loop.run_in_executor(executor, _render_worker, user_data, certificate_id)
+                except BrokenProcessPool:
+                    # Bir marta qayta urinish; yana buzilsa xato handler'ga chiqadi
+                    self._replace_broken(executor)
+                    return await loop.run_in_executor(self.executor, _render_worker, user_data, certificate_id)
+        finally:
+            self.pending -= 1
+            RENDER_QUEUE_DEPTH.set(self.pending)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+# bot.py dagi kabi modullar repo ildizidan import qilinadi
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # Postgres kabi o'qish yozishni to'smasin; yozuvchilar navbat kutadi
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA busy_timeout=60000')
+    cursor.close()
+
+
+@pytest.fixture
+def make_db(tmp_path, monkeypatch):
+    """Vaqtinchalik SQLite fayl ustida Database (Neon o'rniga)"""
+    def factory(name='bot.db', **kwargs):
+        monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / name}")
+        database = Database(**kwargs)
+        event.listen(database.engine, 'connect', _sqlite_pragmas)
+        database.engine.dispose()
+        return database
+    return factory
+
+
+@pytest.fixture
+def db(make_db):
+    database = make_db()
+    yield database
+    database.engine.dispose()
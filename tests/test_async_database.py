@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+from database import AsyncDatabase, REQUIRED_REFERRALS
+
+HANDLERS = 200
+
+
+async def fake_start_handler(adb, user_id, referral_code):
+    """bot.start dagi DB chaqiruvlari ketma-ketligi"""
+    referrer = await adb.get_user_by_referral_code(referral_code)
+    user = await adb.add_user(user_id, f"user{user_id}", f"User {user_id}", referrer.user_id)
+    assert user is not None
+    assert (await adb.get_user(user_id)).user_id == user_id
+    return user
+
+
+def test_concurrent_handlers(db):
+    adb = AsyncDatabase(db)
+    try:
+        async def scenario():
+            referrer = await adb.add_user(1, 'promoter', 'Promoter')
+            await asyncio.gather(*(
+                fake_start_handler(adb, user_id, referrer.referral_code)
+                for user_id in range(2, HANDLERS + 2)
+            ))
+            page = await adb.get_referrals(1)
+            # Bir vaqtda ikkita "Sertifikat olish" bosilishi - faqat bittasi o'tadi
+            claims = await asyncio.gather(adb.claim_certificate(1), adb.claim_certificate(1))
+            return page, claims, await adb.get_stats()
+
+        page, claims, stats = asyncio.run(scenario())
+    finally:
+        adb.close()
+
+    assert len(page['items']) == 20 and page['next'] is not None
+    assert sorted(ok for ok, _ in claims) == [False, True]
+    assert stats['total_users'] == HANDLERS + 1
+    assert stats['total_referrals'] == HANDLERS
+    assert stats['total_certificates'] == 1
+    assert db.load_user(1).referrals_count == HANDLERS >= REQUIRED_REFERRALS
+
+
+def test_slow_query_does_not_block_event_loop(db):
+    adb = AsyncDatabase(db, max_workers=4)
+    release = threading.Event()
+    original = db.get_stats
+
+    def slow_get_stats():
+        release.wait(5)
+        return original()
+
+    db.get_stats = slow_get_stats
+    try:
+        async def scenario():
+            db.add_user(1, 'a', 'A')
+            slow = asyncio.ensure_future(adb.get_stats())
+            await asyncio.sleep(0)
+            # Sekin so'rov ishlayotganda boshqa handlerlar javob oladi
+            started = time.perf_counter()
+            pages = await asyncio.gather(*(adb.get_referrals(1) for _ in range(20)))
+            elapsed = time.perf_counter() - started
+            assert not slow.done()
+            release.set()
+            return pages, elapsed, await slow
+
+        pages, elapsed, stats = asyncio.run(scenario())
+    finally:
+        release.set()
+        adb.close()
+
+    assert all(page['items'] == [] for page in pages)
+    assert elapsed < 1
+    assert stats['total_users'] == 1
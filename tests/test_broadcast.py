@@ -0,0 +1,156 @@
+import asyncio
+import time
+from collections import Counter
+
+from telegram.error import Forbidden, NetworkError, RetryAfter, TimedOut
+
+import broadcast
+from broadcast import MAX_RETRIES, Broadcaster
+from database import AsyncDatabase
+
+USERS = 400
+RATE = 200
+BLOCKED = {13, 99}
+
+
+class FakeBot:
+    """send_message vaqtlarini yozib boradi; RetryAfter va Forbidden ni taqlid qiladi"""
+
+    def __init__(self, retry_after_at=None, latency=0.002):
+        self.sent = []  # (monotonic vaqt, chat_id)
+        self.calls = 0
+        self.retry_after_at = retry_after_at
+        self.retry_after_until = 0
+        self.latency = latency
+
+    async def send_message(self, chat_id, text):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.calls == self.retry_after_at:
+            self.retry_after_until = time.monotonic() + 0.3
+            raise RetryAfter(0.3)
+        if time.monotonic() < self.retry_after_until:
+            raise AssertionError("RetryAfter pauzasi buzildi")
+        if chat_id in BLOCKED:
+            raise Forbidden("bot was blocked by the user")
+        self.sent.append((time.monotonic(), chat_id))
+
+
+def populate(db):
+    for user_id in range(1, USERS + 1):
+        db.add_user(user_id, None, f"User {user_id}")
+
+
+def max_in_window(timestamps, window=1.0):
+    timestamps = sorted(timestamps)
+    best = start = 0
+    for end in range(len(timestamps)):
+        while timestamps[end] - timestamps[start] > window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def test_throughput_and_rate_limit(db):
+    populate(db)
+    adb = AsyncDatabase(db)
+    bot = FakeBot(retry_after_at=50)
+    try:
+        async def scenario():
+            broadcast = await adb.create_broadcast("Salom", 1)
+            started = time.monotonic()
+            result = await Broadcaster(bot, adb, rate=RATE, workers=8, batch_size=100).run(broadcast)
+            return result, time.monotonic() - started
+
+        (sent, failed), elapsed = asyncio.run(scenario())
+        unfinished = asyncio.run(adb.get_unfinished_broadcasts())
+    finally:
+        adb.close()
+
+    print(f"\n{sent} yuborildi, {failed} xato, {elapsed:.2f} s ({len(bot.sent) / elapsed:.0f} xabar/s)")
+    assert (sent, failed) == (USERS - len(BLOCKED), len(BLOCKED))
+    delivered = Counter(chat_id for _, chat_id in bot.sent)
+    assert set(delivered) == set(range(1, USERS + 1)) - BLOCKED
+    assert max(delivered.values()) == 1
+    # Global limit: istalgan 1 sekundlik oynada RATE dan ko'p emas
+    assert max_in_window([at for at, _ in bot.sent]) <= RATE + 1
+    # Throughput limitga yaqin (RetryAfter pauzasi bilan)
+    assert elapsed < USERS / RATE + 0.3 + 1.0
+    assert not unfinished
+
+
+def test_resume_after_interruption(db):
+    populate(db)
+    adb = AsyncDatabase(db)
+    first, second = FakeBot(), FakeBot()
+    try:
+        async def interrupted():
+            broadcast = await adb.create_broadcast("Salom", 1)
+            task = asyncio.ensure_future(Broadcaster(first, adb, rate=RATE, batch_size=50).run(broadcast))
+            while len(first.sent) < 180:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        async def resumed():
+            [broadcast] = await adb.get_unfinished_broadcasts()
+            return broadcast, await Broadcaster(second, adb, rate=RATE, batch_size=50).run(broadcast)
+
+        asyncio.run(interrupted())
+        broadcast, (sent, failed) = asyncio.run(resumed())
+    finally:
+        adb.close()
+
+    first_ids = {chat_id for _, chat_id in first.sent}
+    second_ids = Counter(chat_id for _, chat_id in second.sent)
+    # Saqlangan progressdan davom etadi: faqat tugallanmagan partiya qayta yuboriladi
+    assert broadcast.last_user_id >= 150
+    assert min(second_ids) == broadcast.last_user_id + 1
+    assert len(first_ids & set(second_ids)) < 50
+    assert first_ids | set(second_ids) == set(range(1, USERS + 1)) - BLOCKED
+    assert max(second_ids.values()) == 1
+    assert sent + failed == USERS
+
+
+class FloodBot:
+    """Belgilangan chatlarga ketma-ket xatolar: {chat_id: [exception, ...]}"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+        self.attempts = Counter()
+
+    async def send_message(self, chat_id, text):
+        self.attempts[chat_id] += 1
+        pending = self.failures.get(chat_id)
+        if pending:
+            raise pending.pop(0)
+        self.sent.append(chat_id)
+
+
+def test_retry_after_never_drops_recipient(db, monkeypatch):
+    monkeypatch.setattr(broadcast, 'RETRY_BACKOFF', 0.01)
+    for user_id in range(1, 21):
+        db.add_user(user_id, None, f"User {user_id}")
+    adb = AsyncDatabase(db)
+    bot = FloodBot({
+        # Flood control MAX_RETRIES dan ko'p marta - baribir yetkaziladi
+        3: [RetryAfter(0.02) for _ in range(MAX_RETRIES * 2)],
+        5: [TimedOut()],
+        # Tarmoq xatosi to'xtamasa cheklangan urinishdan keyin xato hisoblanadi
+        7: [NetworkError("connection reset") for _ in range(MAX_RETRIES * 2)],
+    })
+    try:
+        async def scenario():
+            record = await adb.create_broadcast("Salom", 1)
+            return await Broadcaster(bot, adb, rate=RATE, batch_size=10).run(record)
+
+        sent, failed = asyncio.run(scenario())
+    finally:
+        adb.close()
+
+    assert (sent, failed) == (19, 1)
+    assert set(bot.sent) == set(range(1, 21)) - {7}
+    assert bot.attempts[3] == MAX_RETRIES * 2 + 1
+    assert bot.attempts[5] == 2
+    assert bot.attempts[7] == MAX_RETRIES
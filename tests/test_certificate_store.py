@@ -0,0 +1,97 @@
+import asyncio
+import os
+import types
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from backfill import backfill
+from certificate_store import CertificateStore
+from certificate_verifier import CertificateVerifier
+from database import AsyncDatabase, REQUIRED_REFERRALS
+from web_server import create_web_app
+
+
+def test_lru_budget_and_adoption(tmp_path):
+    store = CertificateStore(str(tmp_path), max_bytes=250)
+    for n in range(3):
+        store.put(f"CERT-{n}", b'x' * 100)
+    # Byudjetdan oshgani uchun eng eskisi o'chirildi
+    assert store.get('CERT-0') is None
+    assert store.get('CERT-1') == b'x' * 100
+    assert sorted(os.listdir(tmp_path)) == ['CERT-1.jpg', 'CERT-2.jpg']
+
+    # Boshqa jarayon (backfill) yozgan fayl indeksga qo'shiladi va byudjetga kiradi
+    other = CertificateStore(str(tmp_path), max_bytes=250)
+    other.put('CERT-9', b'y' * 100)
+    assert store.get('CERT-9') == b'y' * 100
+    assert store.total_bytes <= 250
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_format_switch_keeps_old_files_in_budget(tmp_path):
+    jpeg = CertificateStore(str(tmp_path), max_bytes=1000, extension='.jpg')
+    for n in range(4):
+        jpeg.put(f"CERT-{n}", b'j' * 100)
+
+    # JPEG -> WEBP: eski fayllar byudjetga kiradi va birinchi bo'lib o'chiriladi
+    webp = CertificateStore(str(tmp_path), max_bytes=450, extension='.webp')
+    assert webp.get('CERT-0') is None
+    assert webp.total_bytes == 400
+    for n in range(3):
+        webp.put(f"CERT-{n}", b'w' * 100)
+    assert webp.total_bytes <= 450
+    assert sorted(os.listdir(tmp_path)) == ['CERT-0.webp', 'CERT-1.webp', 'CERT-2.webp', 'CERT-3.jpg']
+    assert webp.get('CERT-1') == b'w' * 100
+
+
+def claim_many(db, claimers):
+    """claimers ta foydalanuvchi sertifikat oladi"""
+    user_id = 1000
+    for claimer in range(1, claimers + 1):
+        db.add_user(claimer, None, f"Claimer {claimer}")
+        for _ in range(REQUIRED_REFERRALS):
+            user_id += 1
+            db.add_user(user_id, None, None, claimer)
+        assert db.claim_certificate(claimer)[0]
+
+
+def test_backfill_respects_store_budget(db, tmp_path):
+    claim_many(db, 6)
+    output_dir = str(tmp_path / 'certificates')
+    sizes = {}
+
+    counts = backfill(db, 'missing-template.jpg', output_dir=output_dir, workers=1, max_bytes=10 ** 9)
+    assert counts == {'rendered': 6, 'skipped': 0}
+    for name in os.listdir(output_dir):
+        sizes[name] = os.path.getsize(os.path.join(output_dir, name))
+
+    # Qayta ishga tushirish: hammasi joriy versiyada
+    assert backfill(db, 'missing-template.jpg', output_dir=output_dir, workers=1)['skipped'] == 6
+
+    # Kichik byudjet: disk hech qachon byudjetdan oshmaydi
+    budget = sum(sorted(sizes.values())[:3])
+    backfill(db, 'missing-template.jpg', output_dir=output_dir, workers=1, force=True, max_bytes=budget)
+    on_disk = [name for name in os.listdir(output_dir)]
+    assert sum(os.path.getsize(os.path.join(output_dir, name)) for name in on_disk) <= budget
+    assert not [name for name in on_disk if name.endswith('.tmp')]
+
+
+def test_public_image_not_rendered_when_pool_busy(db):
+    claim_many(db, 1)
+    adb = AsyncDatabase(db)
+    certificate_id = db.get_user(1).certificate_id
+
+    async def busy(record):
+        return None
+
+    async def scenario():
+        app = create_web_app(types.SimpleNamespace(bot=None), verifier=CertificateVerifier(adb),
+                             certificate_image=busy)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get('/certificate', params={'id': certificate_id, 'image': '1'})
+            return response.status, response.headers.get('Retry-After')
+
+    try:
+        assert asyncio.run(scenario()) == (503, '30')
+    finally:
+        adb.close()
@@ -0,0 +1,106 @@
+import asyncio
+import random
+import types
+from datetime import datetime
+
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy import update
+
+from certificate_verifier import CertificateVerifier
+from database import AsyncDatabase, REQUIRED_REFERRALS, User
+from web_server import create_web_app
+
+
+def claimed_certificate(db):
+    db.add_user(1, 'promoter', 'Promoter')
+    for user_id in range(2, REQUIRED_REFERRALS + 2):
+        db.add_user(user_id, None, f"User {user_id}", 1)
+    ok, record = db.claim_certificate(1)
+    assert ok
+    return record.certificate_id
+
+
+def test_verification_endpoint_caches(db):
+    certificate_id = claimed_certificate(db)
+    adb = AsyncDatabase(db)
+    verifier = CertificateVerifier(adb)
+    lookups = []
+    original = db.get_certificate
+    db.get_certificate = lambda cid: lookups.append(cid) or original(cid)
+
+    async def scenario():
+        app = create_web_app(types.SimpleNamespace(bot=None), verifier=verifier)
+        async with TestClient(TestServer(app)) as client:
+            results = {}
+            for _ in range(50):
+                response = await client.get('/certificate', params={'id': certificate_id, 'format': 'json'})
+                results['valid'] = (response.status, await response.json(), response.headers['ETag'])
+            response = await client.get('/certificate', params={'id': certificate_id, 'format': 'json'},
+                                        headers={'If-None-Match': results['valid'][2]})
+            results['conditional'] = response.status
+            for _ in range(20):
+                response = await client.get('/certificate', params={'id': 'CERT-209901-AAAAAAAA'})
+                results['missing'] = response.status
+                response = await client.get('/certificate', params={'id': "' OR 1=1 --"})
+                results['bogus'] = response.status
+            return results
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        adb.close()
+
+    status, payload, _ = results['valid']
+    assert status == 200 and payload['valid'] and payload['name'] == 'Promoter'
+    assert results['conditional'] == 304
+    assert results['missing'] == 404 and results['bogus'] == 404
+    # Haqiqiy va mavjud bo'lmagan ID bir martadan, noto'g'ri formatdagi umuman DB ga bormaydi
+    assert lookups == [certificate_id, 'CERT-209901-AAAAAAAA']
+
+
+def test_warmed_verifier_never_queries_unknown_ids(db):
+    certificate_id = claimed_certificate(db)
+    adb = AsyncDatabase(db)
+    verifier = CertificateVerifier(adb)
+    lookups = []
+    original = db.get_certificate
+    db.get_certificate = lambda cid: lookups.append(cid) or original(cid)
+    rng = random.Random(11)
+    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+    scanned = [f"CERT-202401-{''.join(rng.choices(alphabet, k=8))}" for _ in range(2000)]
+
+    async def scenario():
+        await verifier.warm()
+        results = {'scanned': [await verifier.lookup(cid) for cid in scanned]}
+        results['valid'] = await verifier.lookup(certificate_id)
+
+        # Shu instance da yangi berilgan sertifikat darhol tanaladi
+        for user_id in range(100, 100 + REQUIRED_REFERRALS):
+            db.add_user(user_id, None, None, 2)
+        ok, record = await adb.claim_certificate(2)
+        assert ok
+        results['claimed_here'] = await verifier.lookup(record.certificate_id)
+
+        # Boshqa instance bergan sertifikat: to'plam oraliq bilan yangilanadi
+        with db.engine.begin() as conn:
+            conn.execute(update(User).where(User.user_id == 3).values(
+                certificate_claimed=1, certificate_id='CERT-202401-OTHER000', claimed_date=datetime.now()
+            ))
+        results['other_before_refresh'] = await verifier.lookup('CERT-202401-OTHER000')
+        verifier.refresh_interval = 0
+        results['other_after_refresh'] = await verifier.lookup('CERT-202401-OTHER000')
+        return results
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        adb.close()
+
+    assert not any(results['scanned'])
+    assert results['valid']['name'] == 'Promoter'
+    assert results['claimed_here']['certificate_id'].startswith('CERT-')
+    assert results['other_before_refresh'] is None
+    assert results['other_after_refresh']['name'] == 'User 3'
+    # 2000 ta tasodifiy ID dan birortasi ham DB ga bormadi
+    assert set(lookups) <= {certificate_id, results['claimed_here']['certificate_id'], 'CERT-202401-OTHER000'}
+    assert verifier.rejected == len(scanned) + 1
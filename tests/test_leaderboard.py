@@ -0,0 +1,39 @@
+import random
+
+from leaderboard import Leaderboard
+
+
+def test_ranks_match_database(db):
+    leaderboard = Leaderboard(db, size=3, capacity=5)
+    rng = random.Random(7)
+    db.add_user(1, 'root', 'Root')
+    leaderboard.warm()
+    for user_id in range(2, 120):
+        db.add_user(user_id, None, f"User {user_id}", rng.randint(1, user_id - 1))
+
+    assert [entry[0] for entry in leaderboard.top()] == [row[0] for row in db.get_top_referrers(3)]
+    for user_id in range(1, 120):
+        user = db.get_user(user_id)
+        rank = leaderboard.rank_in_memory(user_id) or leaderboard.rank_for_count(user.referrals_count)
+        assert rank == db.get_user_rank(user_id)[0]
+
+    # Qayta yuklashdan keyin ham bir xil
+    leaderboard.warm()
+    assert leaderboard.rank_for_count(0) == db.get_user_rank(119)[0]
+
+
+def test_failing_listener_does_not_undo_committed_signup(db):
+    leaderboard = Leaderboard(db, size=3, capacity=5)
+    db.add_user(1, 'root', 'Root')
+    leaderboard.warm()
+
+    def broken(*credited):
+        raise RuntimeError("listener xatosi")
+
+    db.referral_listeners.insert(0, broken)
+    record = db.add_user(2, None, 'User 2', 1)
+
+    assert record is not None and record.user_id == 2
+    assert db.load_user(1).referrals_count == 1
+    # Keyingi listener baribir chaqirilgan
+    assert leaderboard.top()[0][0] == 1
@@ -0,0 +1,47 @@
+import asyncio
+import types
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from database import AsyncDatabase
+from metrics import track_handler
+from web_server import create_web_app
+
+TOKEN = 'metrics-token'
+
+
+def scrape(headers=None, metrics_token=TOKEN):
+    async def scenario():
+        app = create_web_app(types.SimpleNamespace(bot=None), metrics_token=metrics_token)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get('/metrics', headers=headers or {})
+            return response.status, await response.text()
+    return asyncio.run(scenario())
+
+
+def test_scrape_after_traffic(db):
+    @track_handler(lambda update: f"button:{update}")
+    async def handler(update, context):
+        return await adb.get_stats()
+
+    adb = AsyncDatabase(db)
+    try:
+        asyncio.run(handler('claim', None))
+    finally:
+        adb.close()
+
+    status, body = scrape({'Authorization': f"Bearer {TOKEN}"})
+    assert status == 200
+    assert 'bot_handler_seconds_count{handler="button:claim"}' in body
+    assert 'bot_db_query_seconds_count{method="get_stats"}' in body
+    assert 'bot_db_pool_checkout_seconds_count' in body
+    assert 'bot_render_queue_depth' in body
+    assert 'bot_telegram_api_seconds' in body
+
+
+def test_scrape_requires_token():
+    assert scrape()[0] == 401
+    assert scrape({'Authorization': 'Bearer wrong'})[0] == 401
+    assert scrape({'Authorization': 'Bearer ключ'.encode().decode('latin-1')})[0] == 401
+    # Token sozlanmagan bo'lsa endpoint umuman yo'q
+    assert scrape({'Authorization': f"Bearer {TOKEN}"}, metrics_token=None)[0] == 404
@@ -0,0 +1,128 @@
+from sqlalchemy import create_engine, delete, inspect, select, text, update
+
+from database import StatsCounter
+from migrations import MIGRATIONS, run_migrations, schema_migrations
+
+# Migratsiyalardan oldingi (baseline) sxema - indekslarsiz
+BASELINE_SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY,
+        user_id BIGINT NOT NULL UNIQUE,
+        username VARCHAR(255),
+        first_name VARCHAR(255),
+        referral_code VARCHAR(50) UNIQUE,
+        referred_by BIGINT,
+        referrals_count INTEGER,
+        certificate_claimed INTEGER,
+        certificate_id VARCHAR(100) UNIQUE,
+        claimed_date DATETIME,
+        created_at DATETIME
+    )""",
+    """CREATE TABLE referrals (
+        id INTEGER PRIMARY KEY,
+        referrer_id BIGINT,
+        referred_id BIGINT UNIQUE,
+        created_at DATETIME
+    )""",
+]
+USERS = 300
+
+
+def populate_baseline(url):
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        for user_id in range(1, USERS + 1):
+            referred_by = user_id // 2 or None
+            conn.execute(text(
+                "INSERT INTO users (user_id, username, first_name, referral_code, referred_by, "
+                "referrals_count, certificate_claimed, certificate_id, created_at) "
+                "VALUES (:user_id, :username, :first_name, :code, :referred_by, :count, :claimed, :cert, '2024-01-01 10:00:00')"
+            ), {
+                'user_id': user_id, 'username': f"user{user_id}", 'first_name': f"User {user_id}",
+                'code': f"REF{user_id}", 'referred_by': referred_by,
+                'count': len([child for child in (2 * user_id, 2 * user_id + 1) if child <= USERS]),
+                'claimed': 1 if user_id % 10 == 0 else 0,
+                'cert': f"CERT-202401-{user_id:08d}" if user_id % 10 == 0 else None
+            })
+            if referred_by:
+                conn.execute(text(
+                    "INSERT INTO referrals (referrer_id, referred_id, created_at) "
+                    "VALUES (:referrer, :referred, '2024-01-01 10:00:00')"
+                ), {'referrer': referred_by, 'referred': user_id})
+    engine.dispose()
+
+
+def test_upgrade_populated_database_in_place(tmp_path, make_db):
+    populate_baseline(f"sqlite:///{tmp_path / 'bot.db'}")
+
+    db = make_db()
+    inspector = inspect(db.engine)
+    assert 'ix_referrals_referrer_created' in {index['name'] for index in inspector.get_indexes('referrals')}
+    assert 'ix_users_referrals_count' in {index['name'] for index in inspector.get_indexes('users')}
+    with db.engine.connect() as conn:
+        applied = list(conn.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version)).scalars())
+    assert applied == [version for version, _, _ in MIGRATIONS]
+
+    # Ma'lumotlar saqlangan va yangi jadvallar mavjud ma'lumotdan to'ldirilgan
+    stats = db.get_stats()
+    assert stats['total_users'] == USERS
+    assert stats['total_referrals'] == USERS - 1
+    assert stats['total_certificates'] == USERS // 10
+    assert db.get_user(7).referrals_count == 2
+    assert db.get_certificate('CERT-202401-00000010')['name'] == 'User 10'
+    page = db.get_referrals(1)
+    assert [item[0] for item in page['items']] == [2, 3]
+    # Referal daraxti migratsiyada mavjud referrals dan qurilgan
+    root = db.get_referral_tree(1)
+    assert (root['depth'], root['descendants'], root['max_depth']) == (0, USERS - 1, 8)
+    assert root['levels'][:3] == [(1, 2), (2, 4), (3, 8)]
+    assert db.get_referral_tree(7)['depth'] == 2
+
+    # Yangi yozuvlar yangilangan sxemada ishlaydi
+    db.add_user(USERS + 1, 'new', 'New', 1)
+    assert db.load_user(1).referrals_count == 3
+    assert db.get_referral_tree(1)['descendants'] == USERS
+    db.engine.dispose()
+
+    # Qayta ishga tushirish - hech narsa o'zgarmaydi
+    again = make_db()
+    with again.engine.connect() as conn:
+        assert conn.execute(select(schema_migrations.c.version)).scalars().all() == applied
+    assert again.get_stats()['total_users'] == USERS + 1
+    again.engine.dispose()
+
+
+def test_fresh_database_tables_come_from_locked_migrations(make_db):
+    db = make_db()
+    assert set(inspect(db.engine).get_table_names()) >= {
+        'certificate_files', 'broadcasts', 'stats_buckets', 'stats_counters', 'referral_paths', 'referral_tree'
+    }
+    assert db.get_stats()['total_users'] == 0
+
+    # Migratsiyada yaratilgan jadvallar ORM modellari bilan ishlaydi
+    db.add_user(1, 'promoter', 'Promoter')
+    db.save_certificate_file_id('CERT-202401-AAAAAAAA', 'file-1')
+    assert db.get_certificate_file_id('CERT-202401-AAAAAAAA') == 'file-1'
+    first, second = db.create_broadcast('salom', 1), db.create_broadcast('xayr', 1)
+    assert second.id == first.id + 1
+    stats = db.get_stats()
+    assert stats['total_users'] == 1 and stats['registrations_24h'] == 1
+    db.engine.dispose()
+
+
+def test_counter_seed_keeps_existing_counters(make_db):
+    # Jadvallar eski kod bilan yaratilgan deploy: 4-migratsiya hisoblagichlarni qayta yozmaydi
+    db = make_db()
+    db.add_user(1, 'promoter', 'Promoter')
+    with db.engine.begin() as conn:
+        conn.execute(delete(schema_migrations).where(schema_migrations.c.version == 4))
+        conn.execute(update(StatsCounter).where(StatsCounter.name == 'total_users').values(value=41))
+        conn.execute(delete(StatsCounter).where(StatsCounter.name == 'total_referrals'))
+    run_migrations(db.engine)
+
+    with db.engine.connect() as conn:
+        counters = dict(conn.execute(select(StatsCounter.name, StatsCounter.value)).all())
+    assert counters == {'total_users': 41, 'total_certificates': 0, 'total_referrals': 0}
+    db.engine.dispose()
@@ -0,0 +1,84 @@
+import random
+import threading
+
+from sqlalchemy import event, select
+
+from database import ReferralPath, ReferralTree
+
+
+def tree_snapshot(db):
+    with db.engine.connect() as conn:
+        paths = sorted(conn.execute(select(ReferralPath.ancestor_id, ReferralPath.descendant_id, ReferralPath.depth)))
+        nodes = sorted(conn.execute(select(
+            ReferralTree.user_id, ReferralTree.depth, ReferralTree.descendants, ReferralTree.max_depth
+        )))
+    return paths, nodes
+
+
+def signup_random_tree(db, first, last, seed=3, existing=None):
+    """Har bir yangi foydalanuvchini mavjudlardan (existing) yoki shu zanjirdagi oldingilardan biri taklif qiladi"""
+    rng = random.Random(seed)
+    referrers = list(existing or range(1, first))
+    for user_id in range(first, last + 1):
+        assert db.add_user(user_id, None, f"User {user_id}", rng.choice(referrers))
+        referrers.append(user_id)
+
+
+def test_incremental_updates_match_rebuild(db):
+    db.add_user(1, 'root', 'Root')
+    signup_random_tree(db, 2, 300)
+    incremental = tree_snapshot(db)
+
+    assert db.rebuild_referral_tree() == 300
+    assert tree_snapshot(db) == incremental
+    tree = db.get_referral_tree(1, levels=300)
+    assert tree['depth'] == 0 and tree['descendants'] == 299
+    assert sum(count for _, count in tree['levels']) == 299
+
+
+def test_signups_during_rebuild_are_not_lost(db):
+    db.add_user(1, 'root', 'Root')
+    signup_random_tree(db, 2, 100)
+
+    reached = threading.Event()
+    release = threading.Event()
+    rebuild_thread = []
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def pause_rebuild(conn, cursor, statement, parameters, context, executemany):
+        # Qurish boshlangan, lekin hali hech narsa yozmagan paytda to'xtaydi
+        if rebuild_thread and threading.current_thread() is rebuild_thread[0] \
+                and statement.startswith('DELETE FROM referral_tree'):
+            reached.set()
+            release.wait()
+
+    deferred = []
+    original_defer = db._defer_tree_update
+    db._defer_tree_update = lambda referrer_id, user_id: deferred.append(user_id) or original_defer(referrer_id, user_id)
+
+    results = {}
+    rebuild = threading.Thread(target=lambda: results.update(nodes=db.rebuild_referral_tree()))
+    rebuild_thread.append(rebuild)
+    rebuild.start()
+    assert reached.wait(10)
+
+    # Qurish paytida ro'yxatdan o'tishlar: mavjud tugunlarga va bir-biriga zanjir bo'lib
+    signups = [
+        threading.Thread(target=signup_random_tree, args=(db, 101 + 20 * n, 120 + 20 * n, n, range(1, 101)))
+        for n in range(4)
+    ]
+    for thread in signups:
+        thread.start()
+    for thread in signups:
+        thread.join(30)
+    release.set()
+    rebuild.join(30)
+
+    assert results['nodes'] == 180
+    # Qurish paytida kelganlar daraxtga tranzaksiya ichida emas, navbat orqali qo'shilgan
+    assert sorted(deferred) == list(range(101, 181))
+    assert not db._tree_rebuilding and not db._tree_backlog
+    incremental = tree_snapshot(db)
+    assert db.get_referral_tree(1)['descendants'] == 179
+    db.rebuild_referral_tree()
+    assert tree_snapshot(db) == incremental
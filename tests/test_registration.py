@@ -0,0 +1,59 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+from database import Referral
+
+SIGNUPS = 1000
+# Referal kod bo'yicha SELECT (kesh bo'sh bo'lsa), users, referrals,
+# referral_paths, referral_tree x3, referrals_count, stats_counters, stats_buckets
+MAX_STATEMENTS_PER_SIGNUP = 10
+
+
+def test_parallel_signups_under_one_referral_code(db):
+    referrer = db.add_user(1, 'promoter', 'Promoter')
+    db.cache.invalidate(1)
+
+    local = threading.local()
+    statements = Counter()
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        user_id = getattr(local, 'user_id', None)
+        if user_id is not None:
+            statements[user_id] += 1
+
+    def signup(user_id):
+        local.user_id = user_id
+        try:
+            # bot.start: referal kod bo'yicha taklif qiluvchini topish va ro'yxatdan o'tkazish
+            found = db.get_user_by_referral_code(referrer.referral_code)
+            return db.add_user(user_id, f"user{user_id}", f"User {user_id}", found.user_id)
+        finally:
+            local.user_id = None
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        records = list(executor.map(signup, range(2, SIGNUPS + 2)))
+
+    assert all(record is not None for record in records)
+    assert db.load_user(1).referrals_count == SIGNUPS
+    stats = db.get_stats()
+    assert stats['total_users'] == SIGNUPS + 1
+    assert stats['total_referrals'] == SIGNUPS
+    with db.Session() as session:
+        assert session.query(Referral).filter_by(referrer_id=1).count() == SIGNUPS
+
+    # Har bir ro'yxatdan o'tish taklif qiluvchining referallari sonidan qat'i nazar
+    # o'zgarmas sondagi so'rov bilan
+    assert len(statements) == SIGNUPS
+    assert max(statements.values()) <= MAX_STATEMENTS_PER_SIGNUP
+
+
+def test_repeated_start_does_not_double_count(db):
+    db.add_user(1, 'promoter', 'Promoter')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: db.add_user(2, 'u', 'U', 1), range(50)))
+    assert db.load_user(1).referrals_count == 1
+    assert db.get_stats()['total_referrals'] == 1
@@ -0,0 +1,38 @@
+import asyncio
+import os
+import signal
+
+from render_service import RenderService, available_cpus
+
+
+def test_pool_sized_by_affinity():
+    service = RenderService(template_path='missing-template.jpg')
+    try:
+        assert service.max_workers == available_cpus() <= (os.cpu_count() or 1)
+    finally:
+        service.shutdown()
+
+
+def test_render_recovers_from_crashed_worker():
+    service = RenderService(template_path='missing-template.jpg', max_workers=1)
+
+    async def scenario():
+        first = await service.render((1, 'user', 'User'), 'CERT-202401-AAAAAAAA')
+        broken = service.executor
+        # OOM killer yoki PIL segfault o'rnida
+        for process in list(broken._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+        second = await asyncio.gather(*(
+            service.render((n, None, f"User {n}"), f"CERT-202401-{n:08d}") for n in range(3)
+        ))
+        third = await service.render((1, 'user', 'User'), 'CERT-202401-AAAAAAAA')
+        return first, broken, second, third
+
+    try:
+        first, broken, second, third = asyncio.run(scenario())
+    finally:
+        service.shutdown()
+
+    assert first and third and all(second)
+    assert service.executor is not broken
+    assert service.pending == 0
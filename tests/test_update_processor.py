@@ -0,0 +1,179 @@
+import asyncio
+import json
+import random
+import time
+import types
+
+from telegram import Update
+from telegram.ext import Application, MessageHandler, filters
+from telegram.request import BaseRequest
+
+from update_processor import PerUserUpdateProcessor
+
+NETWORK_LATENCY = 0.005
+DB_LATENCY = 0.005
+
+
+def fake_update(user_id):
+    return types.SimpleNamespace(effective_user=types.SimpleNamespace(id=user_id))
+
+
+def test_same_user_serialized_in_order():
+    processor = PerUserUpdateProcessor(8)
+    log = []
+
+    async def handler(user_id, n):
+        log.append((user_id, n, 'start'))
+        await asyncio.sleep(random.random() / 100)
+        log.append((user_id, n, 'end'))
+
+    async def scenario():
+        await asyncio.gather(*(
+            processor.process_update(fake_update(user_id), handler(user_id, n))
+            for n in range(10) for user_id in (1, 2)
+        ))
+
+    asyncio.run(scenario())
+    for user_id in (1, 2):
+        events = [(n, kind) for uid, n, kind in log if uid == user_id]
+        assert events == [(n, kind) for n in range(10) for kind in ('start', 'end')]
+    assert not processor._user_locks
+
+
+def test_queued_user_does_not_hold_global_slots():
+    """Bir foydalanuvchining navbatdagi bosishlari boshqalarni kutdirmasligi kerak"""
+    processor = PerUserUpdateProcessor(4)
+
+    async def scenario():
+        tasks = [
+            asyncio.ensure_future(processor.process_update(fake_update(1), asyncio.sleep(0.1)))
+            for _ in range(8)
+        ]
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        await processor.process_update(fake_update(2), asyncio.sleep(0))
+        waited = time.perf_counter() - started
+        await asyncio.gather(*tasks)
+        return waited
+
+    assert asyncio.run(scenario()) < 0.05
+
+
+def test_global_limit_enforced_without_overriding_final_method():
+    processor = PerUserUpdateProcessor(4)
+    running = []
+    peak = []
+
+    async def handler():
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+
+    async def scenario():
+        await asyncio.gather(*(
+            processor.process_update(fake_update(user_id), handler()) for user_id in range(40)
+        ), *(processor.process_update(types.SimpleNamespace(), handler()) for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert max(peak) == processor.limit == 4
+    assert 'process_update' not in PerUserUpdateProcessor.__dict__
+
+
+class StubRequest(BaseRequest):
+    """Telegram Bot API o'rniga: har bir chaqiruv NETWORK_LATENCY kutadi"""
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        await asyncio.sleep(NETWORK_LATENCY)
+        endpoint = url.rsplit('/', 1)[-1]
+        if endpoint == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bot', 'username': 'test_bot'}
+        else:
+            chat_id = request_data.parameters['chat_id']
+            result = {'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}, 'text': 'ok'}
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def message_update(update_id, user_id, bot):
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+            'text': str(update_id)
+        }
+    }, bot)
+
+
+def run_load(updates_per_second=300, duration=2.0, users=200, burst_user=0, burst_size=40, limit=8):
+    """Sintetik updatelarni Application orqali o'tkazish.
+    Natija: {update_id: (user_id, kechikish sekundlarda)} va har bir foydalanuvchi tartibi"""
+    latencies = {}
+    order = {}
+    enqueued = {}
+
+    async def handler(update, context):
+        # DB chaqiruvi va javob xabari
+        await asyncio.sleep(DB_LATENCY)
+        await context.bot.send_message(update.effective_chat.id, 'ok')
+        order.setdefault(update.effective_user.id, []).append(update.update_id)
+        latencies[update.update_id] = (update.effective_user.id, time.perf_counter() - enqueued[update.update_id])
+
+    async def scenario():
+        application = (
+            Application.builder()
+            .token('1:TEST')
+            .request(StubRequest())
+            .get_updates_request(StubRequest())
+            .updater(None)
+            .concurrent_updates(PerUserUpdateProcessor(limit))
+            .build()
+        )
+        application.add_handler(MessageHandler(filters.ALL, handler))
+        rng = random.Random(3)
+        total = int(updates_per_second * duration)
+        async with application:
+            await application.start()
+            for update_id in range(1, total + 1):
+                if burst_user and update_id == total // 4:
+                    # Tugmani ketma-ket bosayotgan foydalanuvchi
+                    for n in range(burst_size):
+                        burst_id = total + 1 + n
+                        enqueued[burst_id] = time.perf_counter()
+                        await application.update_queue.put(message_update(burst_id, burst_user, application.bot))
+                enqueued[update_id] = time.perf_counter()
+                await application.update_queue.put(message_update(update_id, rng.randint(1, users), application.bot))
+                await asyncio.sleep(1 / updates_per_second)
+            while len(latencies) < len(enqueued):
+                await asyncio.sleep(0.01)
+            await application.stop()
+
+    asyncio.run(scenario())
+    return latencies, order
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2], ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+def test_load_p50_p99():
+    latencies, order = run_load(burst_user=999999)
+    normal = [latency for user_id, latency in latencies.values() if user_id != 999999]
+    p50, p99 = percentiles(normal)
+    print(f"\n{len(latencies)} update: p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms")
+
+    # Har bir foydalanuvchining updatelari kelgan tartibda bajarilgan
+    for updates in order.values():
+        assert updates == sorted(updates)
+    # Ketma-ket bosishlar (40 x ~10 ms) boshqalarning kechikishiga qo'shilmaydi
+    assert p99 < 0.15
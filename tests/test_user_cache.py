@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+from sqlalchemy import event
+
+from database import AsyncDatabase
+from user_cache import MISS, UserCache, UserRecord
+
+
+def record(user_id, referrals_count=0):
+    return UserRecord(user_id, None, f"User {user_id}", f"REF{user_id}", None, referrals_count, 0, None, None, None)
+
+
+def test_stale_fill_after_invalidate_is_dropped():
+    cache = UserCache()
+    token = cache.fill_token()
+    cache.invalidate(1)
+    cache.put_user(record(1, 9), token)
+    assert cache.get_user(1) is MISS
+
+    # Invalidate dan keyin boshlangan o'qish keshlanadi
+    cache.put_user(record(1, 10), cache.fill_token())
+    assert cache.get_user(1).referrals_count == 10
+    # Boshqa foydalanuvchining invalidate'i xalaqit bermaydi
+    token = cache.fill_token()
+    cache.invalidate(2)
+    cache.put_user(record(3), token)
+    assert cache.get_user(3) is not MISS
+
+
+def test_pruned_invalidations_stay_conservative():
+    cache = UserCache(maxsize=2)
+    token = cache.fill_token()
+    for user_id in range(1, 6):
+        cache.invalidate(user_id)
+    # 1 ning invalidate yozuvi chiqarib tashlangan, lekin token undan eski
+    cache.put_user(record(1), token)
+    assert cache.get_user(1) is MISS
+    cache.put_user(record(1), cache.fill_token())
+    assert cache.get_user(1) is not MISS
+
+
+def test_load_racing_with_referral_credit(db):
+    """load_user eski qatorni o'qiydi, shu orada add_user referalni hisoblaydi"""
+    db.add_user(1, 'promoter', 'Promoter')
+    for user_id in range(2, 11):
+        db.add_user(user_id, None, f"User {user_id}", 1)
+    db.cache.invalidate(1)
+
+    row_read = threading.Event()
+    credited = threading.Event()
+
+    @event.listens_for(db.engine, 'after_cursor_execute')
+    def pause_after_read(conn, cursor, statement, parameters, context, executemany):
+        if threading.current_thread().name == 'reader' and statement.lstrip().upper().startswith('SELECT'):
+            row_read.set()
+            credited.wait(5)
+
+    reader = threading.Thread(target=db.load_user, args=(1,), name='reader')
+    reader.start()
+    assert row_read.wait(5)
+    db.add_user(11, None, 'User 11', 1)
+    credited.set()
+    reader.join()
+
+    user = db.get_user(1)
+    assert user.referrals_count == 10
+    assert db.check_claim(user)[0]
+
+
+def test_code_lookup_counts_once():
+    cache = UserCache()
+    assert cache.get_user_by_code('REF1') == (None, MISS)
+    cache.put_user(record(1))
+    assert cache.get_user_by_code('REF1') == (1, record(1))
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    # Kod ma'lum, yozuv eskirgan - bitta miss, user_id bilan DB dan o'qiladi
+    cache.invalidate(1)
+    assert cache.get_user_by_code('REF1') == (1, MISS)
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+
+def test_async_code_hit_skips_thread_pool(db):
+    referrer = db.add_user(1, 'promoter', 'Promoter')
+    adb = AsyncDatabase(db)
+    submitted = []
+    original = adb._run
+    adb._run = lambda func, *args: submitted.append(func.__name__) or original(func, *args)
+    before = db.cache.stats()
+
+    async def scenario():
+        hit = await adb.get_user_by_referral_code(referrer.referral_code)
+        db.cache.invalidate(1)
+        stale = await adb.get_user_by_referral_code(referrer.referral_code)
+        unknown = await adb.get_user_by_referral_code('REFNOPE')
+        return hit, stale, unknown
+
+    try:
+        hit, stale, unknown = asyncio.run(scenario())
+    finally:
+        adb.close()
+
+    after = db.cache.stats()
+    assert hit.user_id == stale.user_id == 1 and unknown is None
+    assert submitted == ['load_user', 'load_user_by_referral_code']
+    assert (after['hits'] - before['hits'], after['misses'] - before['misses']) == (1, 2)
@@ -0,0 +1,96 @@
+import asyncio
+import types
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from web_server import SECRET_HEADER, create_web_app, ensure_webhook
+
+SECRET = 'a' * 64
+
+
+def webhook_client(queue):
+    application = types.SimpleNamespace(bot=None, update_queue=queue)
+    return TestClient(TestServer(create_web_app(application, webhook_path='/telegram', secret_token=SECRET)))
+
+
+def post_webhook(*requests):
+    """[(headers, body), ...] -> (status kodlari, navbatga tushgan updatelar)"""
+    async def scenario():
+        queue = asyncio.Queue()
+        async with webhook_client(queue) as client:
+            statuses = []
+            for headers, body in requests:
+                response = await client.post('/telegram', data=body, headers=headers)
+                statuses.append(response.status)
+        return statuses, queue.qsize()
+    return asyncio.run(scenario())
+
+
+def test_webhook_rejects_bad_secret_tokens():
+    statuses, queued = post_webhook(
+        ({}, '{"update_id": 1}'),
+        ({SECRET_HEADER: 'wrong'}, '{"update_id": 1}'),
+        # ASCII bo'lmagan sarlavha 500 emas, 403 qaytarishi kerak
+        ({SECRET_HEADER: 'sirli-kalit-ё'.encode().decode('latin-1')}, '{"update_id": 1}'),
+    )
+    assert statuses == [403, 403, 403]
+    assert queued == 0
+
+
+def test_webhook_validates_body():
+    headers = {SECRET_HEADER: SECRET}
+    statuses, queued = post_webhook(
+        (headers, 'not json'),
+        (headers, '[1, 2]'),
+        (headers, '{"message": 1}'),
+        (headers, '{"update_id": 7}'),
+    )
+    assert statuses == [400, 400, 400, 200]
+    assert queued == 1
+
+
+def test_certificate_unavailable_until_schema_ready():
+    class NoDatabase:
+        async def lookup(self, certificate_id):
+            raise AssertionError("sxema tayyor bo'lmaguncha DB ga murojaat qilinmaydi")
+
+    async def scenario():
+        app = create_web_app(types.SimpleNamespace(bot=None), verifier=NoDatabase())
+        app['schema_ready'] = False
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get('/certificate', params={'id': 'CERT-202401-AAAAAAAA'})
+            ready = await client.get('/ready')
+            return response.status, response.headers.get('Retry-After'), ready.status
+
+    assert asyncio.run(scenario()) == (503, '5', 503)
+
+
+class FakeWebhookBot:
+    def __init__(self, url='', allowed_updates=None):
+        self.info = types.SimpleNamespace(url=url, allowed_updates=allowed_updates)
+        self.calls = []
+
+    async def get_webhook_info(self):
+        return self.info
+
+    async def set_webhook(self, **kwargs):
+        self.calls.append(kwargs)
+        self.info = types.SimpleNamespace(url=kwargs['url'], allowed_updates=tuple(kwargs['allowed_updates']))
+
+
+def test_webhook_set_only_when_changed_and_keeps_pending_updates():
+    url = 'https://bot.example.com/telegram'
+    allowed = ['message', 'callback_query']
+    bot = FakeWebhookBot()
+
+    async def scenario():
+        changes = [await ensure_webhook(bot, url, SECRET, allowed)]
+        # Uyg'onish / qayta deploy - webhook o'sha, qayta o'rnatilmaydi
+        changes.append(await ensure_webhook(bot, url, SECRET, allowed))
+        changes.append(await ensure_webhook(bot, url + '2', SECRET, allowed))
+        changes.append(await ensure_webhook(bot, url + '2', SECRET, allowed + ['inline_query']))
+        return changes
+
+    assert asyncio.run(scenario()) == [True, False, True, True]
+    assert len(bot.calls) == 3
+    assert not any(call.get('drop_pending_updates') for call in bot.calls)
@@ -0,0 +1,56 @@
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+# BaseUpdateProcessor.process_update (@final) o'z semaphore'ini do_process_update
+# dan oldin oladi. U amalda cheklamasligi uchun bazaga juda katta son beriladi
+_BASE_LIMIT = 2 ** 31 - 1
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Updatelarni parallel qayta ishlash, lekin bitta foydalanuvchinikini ketma-ket.
+
+    Umumiy parallellik max_concurrent_updates (limit) bilan cheklanadi. Bir user_id
+    dan kelgan updatelar FIFO lock orqali navbat bilan bajariladi, shuning
+    uchun masalan "Sertifikat olish" ikki marta bosilsa claim poyga qilmaydi.
+    Lock umumiy slotdan oldin olinadi: o'z navbatini kutayotgan updatelar
+    slotlarni band qilmaydi va boshqa foydalanuvchilarni to'sib qo'ymaydi.
+
+    Bazaviy semaphore tartibini o'zgartirib bo'lmaydi (process_update @final),
+    shuning uchun faqat qo'llab-quvvatlanadigan do_process_update kengaytiriladi:
+    bazaniki amalda cheksiz, haqiqiy chegara (limit) - lock dan keyin
+    olinadigan o'zimizning semaphore.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        super().__init__(_BASE_LIMIT)
+        self.limit = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._user_locks = {}  # user_id -> [asyncio.Lock, kutayotganlar soni]
+
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, 'effective_user', None)
+        if user is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._user_locks.setdefault(user.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                # Oldingi update tugagandan keyingina umumiy slot olinadi
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._user_locks[user.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
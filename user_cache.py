@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# ORM obyekt o'rniga sessiyaga bog'lanmagan oddiy yozuv
+UserRecord = namedtuple('UserRecord', [
+    'user_id', 'username', 'first_name', 'referral_code', 'referred_by',
+    'referrals_count', 'certificate_claimed', 'certificate_id', 'claimed_date', 'created_at'
+])
+
+MISS = object()
+
+
+def to_record(user):
+    if user is None:
+        return None
+    return UserRecord(*(getattr(user, field) for field in UserRecord._fields))
+
+
+class UserCache:
+    """Foydalanuvchi yozuvlari va referal kod -> user_id uchun LRU/TTL kesh.
+
+    Database ichidan threadlardan chaqiriladi, shuning uchun lock bilan.
+
+    DB dan o'qib keshga yozish invalidate bilan poyga qilmasligi uchun o'qishdan
+    oldin fill_token() olinadi: o'qish davomida yozuv invalidate qilingan
+    bo'lsa, put_user(record, token) eski qiymatni keshga yozmaydi.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._users = OrderedDict()  # user_id -> (expires_at, UserRecord)
+        self._codes = OrderedDict()  # referral_code -> user_id
+        self._sequence = 0  # har bir invalidate da oshadi
+        self._invalidated = OrderedDict()  # user_id -> oxirgi invalidate raqami
+        self._floor = 0  # _invalidated dan chiqarib tashlanganlarning eng kattasi
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, user_id):
+        """Lock ostida chaqiriladi; hit/miss hisoblamaydi"""
+        entry = self._users.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return MISS
+        self._users.move_to_end(user_id)
+        return entry[1]
+
+    def get_user(self, user_id):
+        with self._lock:
+            record = self._lookup(user_id)
+            if record is MISS:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return record
+
+    def fill_token(self):
+        """DB dan o'qishdan oldin olinadi va put_user ga beriladi"""
+        with self._lock:
+            return self._sequence
+
+    def put_user(self, record, token=None):
+        """token berilsa, o'shandan keyin invalidate qilingan yozuv saqlanmaydi.
+        token=None - yozuvning o'zidan olingan (RETURNING) yangi qiymat"""
+        with self._lock:
+            if token is not None and self._invalidated.get(record.user_id, self._floor) > token:
+                return
+            self._users[record.user_id] = (time.monotonic() + self.ttl, record)
+            self._users.move_to_end(record.user_id)
+            if len(self._users) > self.maxsize:
+                self._users.popitem(last=False)
+            # Referal kod o'zgarmaydi, shuning uchun TTL kerak emas
+            self._codes[record.referral_code] = record.user_id
+            self._codes.move_to_end(record.referral_code)
+            if len(self._codes) > self.maxsize:
+                self._codes.popitem(last=False)
+
+    def get_user_by_code(self, code):
+        """(user_id yoki None, yozuv yoki MISS). Bitta qidiruv - bitta hit yoki miss:
+        kod ma'lum, lekin yozuv eskirgan bo'lsa user_id bilan DB dan o'qiladi"""
+        with self._lock:
+            user_id = self._codes.get(code)
+            record = MISS if user_id is None else self._lookup(user_id)
+            if record is MISS:
+                self.misses += 1
+            else:
+                self._codes.move_to_end(code)
+                self.hits += 1
+            return user_id, record
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+            self._sequence += 1
+            self._invalidated[user_id] = self._sequence
+            self._invalidated.move_to_end(user_id)
+            if len(self._invalidated) > self.maxsize:
+                _, sequence = self._invalidated.popitem(last=False)
+                self._floor = sequence
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._users)
+            }
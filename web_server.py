@@ -0,0 +1,155 @@
+import hashlib
+import html
+import json
+import logging
+import secrets
+
+from aiohttp import web
+from telegram import Update
+
+from metrics import render_latest
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+CERTIFICATE_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body style="font-family:sans-serif;text-align:center;margin-top:10%">
+<h1>{title}</h1>{body}</body></html>"""
+
+
+def certificate_page(record, as_json):
+    if as_json:
+        payload = dict(record, valid=True) if record else {'valid': False}
+        return json.dumps(payload, ensure_ascii=False), 'application/json'
+    if record:
+        body = (
+            f"<p>{html.escape(record['name'])}</p>"
+            f"<p>ID: {html.escape(record['certificate_id'])}</p>"
+            f"<p>{html.escape((record['claimed_date'] or '')[:10])}</p>"
+        )
+        return CERTIFICATE_HTML.format(title="✅ Sertifikat haqiqiy", body=body), 'text/html'
+    return CERTIFICATE_HTML.format(title="❌ Sertifikat topilmadi", body=""), 'text/html'
+
+
+def token_matches(received, expected):
+    """Vaqt bo'yicha sizdirmaydigan solishtirish (baytlar - ASCII bo'lmagan sarlavhalar uchun)"""
+    return secrets.compare_digest(received.encode('utf-8', 'surrogateescape'), expected.encode())
+
+
+def create_web_app(application, webhook_path=None, secret_token=None, verifier=None, certificate_image=None,
+                   metrics_token=None):
+    """Bitta asyncio HTTP server: health/tekshiruv yo'llari va (ixtiyoriy) Telegram webhook.
+    /metrics faqat metrics_token berilganda, Authorization: Bearer <token> bilan ochiladi"""
+    web_app = web.Application()
+    web_app['application'] = application
+    web_app['ready'] = False
+    # serve() sxema tekshiruvi tugaguncha False qiladi - DB ga tegadigan yo'llar 503 qaytaradi
+    web_app['schema_ready'] = True
+
+    async def home(request):
+        return web.Response(text='Bot ishlayapti!')
+
+    async def health(request):
+        return web.Response(text='OK')
+
+    async def ready(request):
+        # serve() bot update qabul qilishga tayyor bo'lganda belgilaydi
+        if not web_app['ready']:
+            return web.Response(status=503, text='Starting')
+        return web.Response(text='OK')
+
+    async def metrics(request):
+        if not token_matches(request.headers.get('Authorization', ''), f"Bearer {metrics_token}"):
+            return web.Response(status=401, headers={'WWW-Authenticate': 'Bearer'})
+        body, content_type = render_latest()
+        return web.Response(body=body, headers={'Content-Type': content_type})
+
+    async def certificate(request):
+        """QR dagi https://.../certificate?id=... tekshiruvi. ?format=json, ?image=1"""
+        if not web_app['schema_ready']:
+            return web.Response(status=503, headers={'Retry-After': '5'})
+        certificate_id = request.query.get('id', '')
+        record = await verifier.lookup(certificate_id)
+        
+        if request.query.get('image'):
+            if record is None or certificate_image is None:
+                return web.Response(status=404)
+            # Ombordan o'chirilgan bo'lsa, bo'sh worker bo'lgandagina qayta chiziladi
+            image = await certificate_image(record)
+            if image is None:
+                return web.Response(status=503, headers={'Retry-After': '30'})
+            data, content_type = image
+            etag = f'"{hashlib.md5(data).hexdigest()}"'
+            headers = {'ETag': etag, 'Cache-Control': 'public, max-age=86400'}
+            if request.headers.get('If-None-Match') == etag:
+                return web.Response(status=304, headers=headers)
+            return web.Response(body=data, content_type=content_type, headers=headers)
+        
+        as_json = request.query.get('format') == 'json' or 'application/json' in request.headers.get('Accept', '')
+        if record is None:
+            text, content_type = certificate_page(None, as_json)
+            return web.Response(status=404, text=text, content_type=content_type,
+                                headers={'Cache-Control': 'public, max-age=60'})
+        
+        # Sertifikat o'zgarmaydi - ETag faqat ID va formatga bog'liq
+        etag = f'"{certificate_id}-{"json" if as_json else "html"}"'
+        headers = {'ETag': etag, 'Cache-Control': 'public, max-age=3600'}
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers=headers)
+        text, content_type = certificate_page(record, as_json)
+        return web.Response(text=text, content_type=content_type, headers=headers)
+
+    async def telegram_webhook(request):
+        # Telegram har bir so'rovda secret_token ni sarlavhada yuboradi.
+        # Baytlar solishtiriladi: str da ASCII bo'lmagan qiymat TypeError beradi
+        if not token_matches(request.headers.get(SECRET_HEADER, ''), secret_token):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+        try:
+            update = Update.de_json(data, application.bot)
+        except (TypeError, KeyError, ValueError, AttributeError):
+            # Update tuzilishiga mos kelmaydigan JSON obyekt
+            return web.Response(status=400)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    web_app.router.add_get('/', home)
+    web_app.router.add_get('/health', health)
+    web_app.router.add_get('/ready', ready)
+    if metrics_token:
+        web_app.router.add_get('/metrics', metrics)
+    if verifier:
+        web_app.router.add_get('/certificate', certificate)
+    if webhook_path:
+        web_app.router.add_post(webhook_path, telegram_webhook)
+    return web_app
+
+
+async def ensure_webhook(bot, url, secret_token, allowed_updates):
+    """Webhook faqat URL yoki allowed_updates o'zgarganda qayta o'rnatiladi.
+
+    Render uyqudan Telegram'ning o'zi yuborgan webhook POST bilan uyg'onadi -
+    har ishga tushishda set_webhook(drop_pending_updates=True) Telegram kutib
+    turgan update'larni (/start, tugma bosishlar) o'chirib yuborardi.
+    """
+    info = await bot.get_webhook_info()
+    if info.url == url and set(info.allowed_updates or ()) == set(allowed_updates):
+        return False
+    await bot.set_webhook(url=url, secret_token=secret_token, allowed_updates=allowed_updates)
+    return True
+
+
+async def start_web_server(web_app, port):
+    runner = web.AppRunner(web_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', port).start()
+    logger.info(f"HTTP server {port}-portda ishga tushdi")
+    return runner